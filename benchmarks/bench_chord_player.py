@@ -0,0 +1,114 @@
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy import signal
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from audio_engine import PLAYBACK_RATE, chord_player, find_note, get_scale, midi_to_frequency
+
+"""
+compares the batched chord_player against the original one, which built every chord on its
+own in a python loop with a sin() per sample (inlined below since the real one is gone)
+
+    python benchmarks/bench_chord_player.py --chords 32 1000 10000
+"""
+
+
+def _original_tone(shape):
+    def tone(frequency, duration, amplitude=0.3, sample_rate=PLAYBACK_RATE):
+        t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
+        if shape == "noise":
+            return np.random.uniform(-1, 1, len(t)) * amplitude
+        phase = 2 * np.pi * frequency * t
+        if shape == "sine":
+            return np.sin(phase) * amplitude
+        if shape == "square":
+            return np.sign(np.sin(phase)) * amplitude
+        return signal.sawtooth(phase, 0.5 if shape == "triangle" else 1) * amplitude
+    return tone
+
+
+ORIGINAL_POOLS = {
+    "Random (All)": ["sine", "square", "triangle", "saw"],
+    "Sine": ["sine"],
+    "Square": ["square"],
+    "Triangle": ["triangle"],
+    "Saw": ["saw"],
+    "Sine + Triangle": ["sine", "triangle"],
+    "Square + Saw": ["square", "saw"],
+}
+
+
+def original(n, bpm, wave, downsample_rate):
+    """the chord_player loop from before the batched rewrite, minus its print"""
+    pool = [_original_tone(shape) for shape in ORIGINAL_POOLS.get(wave, ["noise"])]
+    scale = get_scale(0, "Major")
+    playable_indices = np.arange(0, len(scale) - 5)
+    duration = 60 / bpm
+    generation_rate = downsample_rate if downsample_rate else PLAYBACK_RATE
+
+    chunk_parts, chord_data = [], []
+    for _ in range(n):
+        root_index_scale = np.random.choice(playable_indices)
+        root_midi, third_midi, fifth_midi = scale[[root_index_scale, root_index_scale + 2, root_index_scale + 4]]
+        distance_third, distance_fifth = third_midi - root_midi, fifth_midi - root_midi
+        quality = {(4, 7): "Maj", (3, 7): "Min", (3, 6): "Dim", (4, 8): "Aug"}.get((distance_third, distance_fifth), "???")
+
+        frequencies = [midi_to_frequency(note) for note in (root_midi, third_midi, fifth_midi)]
+        waves = [random.choice(pool)(frequency, duration, sample_rate=generation_rate) for frequency in frequencies]
+        chord_data.append({"root": frequencies[0], "third": frequencies[1], "fifth": frequencies[2],
+                           "quality": quality, "note_name": find_note(frequencies[0])})
+
+        chord = (waves[0] + waves[1] + waves[2]) * 0.3
+        fade_len = min(100, len(chord) // 2)
+        chord[:fade_len] *= np.linspace(0, 1, fade_len)
+        chord[-fade_len:] *= np.linspace(1, 0, fade_len)
+
+        if downsample_rate:
+            target_length = int(duration * PLAYBACK_RATE)
+            step = PLAYBACK_RATE / downsample_rate
+            indexes = np.clip(np.arange(target_length) / step, 0, len(chord) - 1)
+            chord = chord[indexes.astype(int)]
+        chunk_parts.append(chord)
+
+    return np.concatenate(chunk_parts), chord_data
+
+
+def batched(n, bpm, wave, downsample_rate):
+    return chord_player(n, bpm, 0, "Major", wave, downsample_rate)[0]
+
+
+def best_time(fn, repeats, *args):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="time the batched chord_player against the original per-chord loop")
+    parser.add_argument("--chords", type=int, nargs="+", default=[32, 1000, 10000])
+    # 300 bpm keeps the 10k chord run under a gig of ram
+    parser.add_argument("--bpm", type=int, default=300)
+    parser.add_argument("--wave", default="Random (All)")
+    parser.add_argument("--downsample", type=int, default=None)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'chords':>8} {'original (s)':>13} {'batched (s)':>12} {'speedup':>8}")
+    for n in args.chords:
+        repeats = 1 if n >= 10000 else args.repeats
+        slow = best_time(original, repeats, n, args.bpm, args.wave, args.downsample)
+        fast = best_time(batched, repeats, n, args.bpm, args.wave, args.downsample)
+        print(f"{n:>8} {slow:>13.4f} {fast:>12.4f} {slow / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+"""
+time to first window and time to first sound for src/main.py, each run is a fresh
+process so imports are paid every time like a real launch
+
+    python benchmarks/bench_startup.py --runs 5 --json startup.json
+"""
+
+MAIN = Path(__file__).resolve().parent.parent / "src" / "main.py"
+
+
+def run_once():
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, str(MAIN), "--startup-benchmark"],
+        capture_output=True, text=True, check=True,
+    )
+    wall = time.perf_counter() - start
+    # the gui prints other stuff too, the timings are the last line
+    timings = json.loads(completed.stdout.strip().splitlines()[-1])
+    timings["process_wall"] = wall
+    return timings
+
+
+def summarise(runs, key):
+    values = [run[key] for run in runs if run[key] is not None]
+    if not values:
+        return None
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="time to first window and first sound for src/main.py, one fresh process per run")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--json", type=Path, help="write the summary here as well")
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    summary = {key: summarise(runs, key) for key in ("first_window", "first_sound", "process_wall")}
+
+    for key, stats in summary.items():
+        if stats is None:
+            print(f"{key:>13}: n/a (no audio device?)")
+        else:
+            print(f"{key:>13}: {stats['median'] * 1000:8.1f} ms  (min {stats['min'] * 1000:.1f}, max {stats['max'] * 1000:.1f})")
+
+    if args.json:
+        args.json.write_text(json.dumps({"runs": runs, "summary": summary}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
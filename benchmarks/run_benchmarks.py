@@ -0,0 +1,275 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent / "src"))
+
+# keep the decoded audio cache for the fixtures away from the real one, unless one was
+# given. the TemporaryDirectory cleans itself up when the interpreter exits
+_bench_cache = None
+if "SATIN_CACHE_DIR" not in os.environ:
+    _bench_cache = tempfile.TemporaryDirectory(prefix="satin-bench-cache-")
+    os.environ["SATIN_CACHE_DIR"] = _bench_cache.name
+
+import soundfile as sf
+
+import audio_loader
+from audio_engine import chord_player, apply_flanger, apply_downsample, SAMPLE_DTYPE
+from midi import read_midi, render_midi
+from audio_player import AudioPlayer
+from audio_backends import NullBackend, WavFileBackend
+
+"""
+headless benchmarks for the dsp / playback hot paths. no sound device needed.
+
+    python benchmarks/run_benchmarks.py --save baseline.json
+    python benchmarks/run_benchmarks.py --compare baseline.json   # exits 1 on a regression
+    python benchmarks/run_benchmarks.py --filter callback
+"""
+
+SAMPLE_RATE = 44100
+WAVES = ["Sine", "Square", "Triangle", "Saw", "Random (All)", "White Noise"]
+DOWNSAMPLE_RATES = [None, 8000, 2000]
+BUFFER_SECONDS = [1, 10, 60]
+BLOCK_SIZES = [64, 256, 1024, 4096]
+PLAYBACK_RATES = [0.5, 1.0, 1.7]
+
+
+def measure(fn, setup=None, min_time=0.2, min_runs=3, max_runs=200):
+    """times fn() until min_time has passed (at least min_runs), setup() runs untimed before each call"""
+    times = []
+    spent = 0.0
+    while len(times) < max_runs and (len(times) < min_runs or spent < min_time):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        spent += elapsed
+    return {"median_s": statistics.median(times), "min_s": min(times), "runs": len(times)}
+
+
+def bench_chord_player():
+    for wave in WAVES:
+        for rate in DOWNSAMPLE_RATES:
+            name = f"chord_player/{wave}/{rate or 'clean'}"
+            yield name, lambda w=wave, r=rate: measure(lambda: chord_player(32, 120, 0, "Major", w, r))
+
+
+def bench_offline_effects():
+    rng = np.random.default_rng(0)
+    for seconds in BUFFER_SECONDS:
+        buffer = rng.uniform(-0.5, 0.5, seconds * SAMPLE_RATE).astype(SAMPLE_DTYPE)
+        yield f"apply_flanger/{seconds}s", lambda b=buffer: measure(lambda: apply_flanger(b))
+        yield f"apply_downsample/{seconds}s", lambda b=buffer: measure(lambda: apply_downsample(b, 8000))
+
+
+def make_fixtures(directory):
+    """a clean 44.1k mono file (soundfile path) and a 48k stereo one (resample path)"""
+    rng = np.random.default_rng(1)
+    fixtures = {}
+    for name, rate, channels in (("mono44k", 44100, 1), ("stereo48k", 48000, 2)):
+        path = Path(directory) / f"{name}.wav"
+        data = rng.uniform(-0.5, 0.5, (rate * 10, channels)).astype(np.float32)
+        sf.write(path, data, rate)
+        fixtures[name] = path
+    return fixtures
+
+
+def bench_loader(fixture_dir):
+    for name, path in make_fixtures(fixture_dir).items():
+        def forget_everything(p=path):
+            audio_loader._memory_cache.clear()
+            audio_loader._hash_cache.clear()  # or cold would skip hashing the file
+            for cached in audio_loader.DECODED_CACHE_DIR.glob("*.npy"):
+                cached.unlink()
+
+        def forget_memory():
+            audio_loader._memory_cache.clear()
+
+        load = lambda p=path: audio_loader.load_wav_file(p)
+        yield f"load_wav_file/{name}/cold", lambda: measure(load, setup=forget_everything, min_runs=2)
+        yield f"load_wav_file/{name}/disk_cache", lambda: measure(load, setup=forget_memory)
+        yield f"load_wav_file/{name}/memory_cache", lambda: measure(load)
+
+
+def _varlen(value):
+    out = [value & 0x7F]
+    value >>= 7
+    while value:
+        out.append(0x80 | (value & 0x7F))
+        value >>= 7
+    return bytes(reversed(out))
+
+
+def write_midi_fixture(path, seconds=120, tracks=8, notes_per_second=16, seed=3):
+    """format 1 file with a tempo change and overlapping notes on several channels, uses running status"""
+    rng = np.random.default_rng(seed)
+    division = 480
+    chunks = []
+
+    tempo = b"".join([
+        _varlen(0), b"\xff\x51\x03", (500000).to_bytes(3, "big"),
+        _varlen(division * seconds), b"\xff\x51\x03", (400000).to_bytes(3, "big"),
+        _varlen(0), b"\xff\x2f\x00",
+    ])
+    chunks.append(tempo)
+
+    for track in range(tracks):
+        events = []
+        for _ in range(seconds * notes_per_second // tracks):
+            start = int(rng.integers(0, division * 2 * seconds))
+            length = int(rng.integers(division // 8, division * 2))
+            note = int(rng.integers(36, 96))
+            events.append((start, 0x90 | track, note, int(rng.integers(30, 127))))
+            events.append((start + length, 0x90 | track, note, 0))  # note on with velocity 0 is an off
+        events.sort()
+        body, last = [], 0
+        for tick, status, note, velocity in events:
+            body.append(_varlen(tick - last) + bytes([note, velocity]) if body else
+                        _varlen(tick - last) + bytes([status, note, velocity]))
+            last = tick
+        body.append(_varlen(0) + b"\xff\x2f\x00")
+        chunks.append(b"".join(body))
+
+    with open(path, "wb") as f:
+        f.write(b"MThd" + (6).to_bytes(4, "big") + (1).to_bytes(2, "big")
+                + (len(chunks)).to_bytes(2, "big") + division.to_bytes(2, "big"))
+        for chunk in chunks:
+            f.write(b"MTrk" + len(chunk).to_bytes(4, "big") + chunk)
+
+
+def bench_midi(fixture_dir):
+    path = Path(fixture_dir) / "dense.mid"
+    write_midi_fixture(path)
+    midi = read_midi(path)
+    yield "midi/read", lambda: measure(lambda: read_midi(path))
+    for wave in (None, "Random (All)"):
+        def run(w=wave):
+            result = measure(lambda: render_midi(midi, w, rng=np.random.default_rng(0)), min_runs=2)
+            result["realtime_factor"] = midi.duration / result["median_s"]
+            return result
+        yield f"midi/render/{wave or 'by channel'}/{len(midi)} notes", run
+
+
+def bench_callback():
+    rng = np.random.default_rng(2)
+    buffer = rng.uniform(-0.5, 0.5, 60 * SAMPLE_RATE).astype(SAMPLE_DTYPE)
+    for blocksize in BLOCK_SIZES:
+        for rate in PLAYBACK_RATES:
+            for effects in (False, True):
+                def run(b=blocksize, r=rate, fx=effects):
+                    player = AudioPlayer(blocksize=b, backend=NullBackend())
+                    player.set_flanger(fx)
+                    player.set_downsample(8000 if fx else None)
+                    player.set_pitch(1.25 if fx else 1.0)
+                    player.looping = True
+                    player.update_rate(r)
+                    player.play(buffer)
+                    blocks = max(50, 200_000 // b)
+
+                    result = measure(lambda: player.backend.pump(blocks * b))
+                    # report per callback and how much of the real time deadline that is
+                    per_call = result["median_s"] / blocks
+                    result.update(per_call_s=per_call, deadline_fraction=per_call * SAMPLE_RATE / b)
+                    return result
+                name = f"callback/block{blocksize}/rate{rate}/{'fx' if effects else 'dry'}"
+                yield name, run
+
+
+def bench_wav_sink(fixture_dir):
+    """the whole playback path into a file, as fast as it goes"""
+    rng = np.random.default_rng(4)
+    buffer = rng.uniform(-0.5, 0.5, 60 * SAMPLE_RATE).astype(SAMPLE_DTYPE)
+    for rate in (1.0, 1.7):
+        def run(r=rate):
+            def render():
+                player = AudioPlayer(backend=WavFileBackend(Path(fixture_dir) / "sink.wav"))
+                player.update_rate(r)
+                player.set_flanger(True)
+                player.play(buffer)
+                player.render_offline()
+                player.close()
+
+            result = measure(render, min_runs=2)
+            result["realtime_factor"] = len(buffer) / r / SAMPLE_RATE / result["median_s"]
+            return result
+        yield f"playback/wav_sink/rate{rate}/60s", run
+
+
+def collect(fixture_dir):
+    yield from bench_chord_player()
+    yield from bench_offline_effects()
+    yield from bench_loader(fixture_dir)
+    yield from bench_midi(fixture_dir)
+    yield from bench_callback()
+    yield from bench_wav_sink(fixture_dir)
+
+
+def compare(results, baseline, threshold):
+    """
+    names that got slower than baseline by more than threshold (0.2 = 20%). goes by the
+    fastest run, the median moves around too much with whatever else the machine is doing
+    """
+    regressions = []
+    for name, result in results.items():
+        old = baseline.get("results", {}).get(name)
+        if old is None:
+            continue
+        ratio = result["min_s"] / old["min_s"] if old["min_s"] else 1.0
+        marker = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            marker = "  <-- regression"
+        print(f"{name:<48} {old['min_s'] * 1000:10.3f} ms -> {result['min_s'] * 1000:10.3f} ms  x{ratio:5.2f}{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="headless benchmarks for the dsp and playback hot paths")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--save", type=Path, help="write results as json")
+    parser.add_argument("--compare", type=Path, help="baseline json from an earlier --save")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging, 0.2 = 20%%")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="satin-bench-") as fixture_dir:
+        for name, bench in collect(fixture_dir):
+            if args.filter not in name:
+                continue
+            results[name] = bench()
+            print(f"{name:<48} {results[name]['median_s'] * 1000:10.3f} ms  ({results[name]['runs']} runs)", flush=True)
+
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+    if args.save:
+        args.save.write_text(json.dumps(report, indent=2))
+
+    if args.compare:
+        print(f"\ncompared to {args.compare}:")
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s)")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
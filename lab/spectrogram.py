@@ -1,13 +1,115 @@
 import sys
+import tempfile
+import threading
 import numpy as np
 from pathlib import Path
-import librosa
+import soundfile as sf
+import scipy.fft
+from scipy import signal
 import pyqtgraph as pg
+from PyQt6.QtCore import QTimer, QRectF
 from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QLabel
 
+"""
+spectrogram that never holds the whole file. the stft runs a chunk of frames at a time
+on a thread and writes dB columns into a memory mapped store, which also keeps coarser
+levels (max of every LOD_FACTOR columns) so zoomed out views only read a few thousand
+columns. the image gets refreshed on a timer so columns show up while they're computed
+"""
+
+N_FFT = 2048
+HOP = 512
+CHUNK_FRAMES = 512  # stft columns per chunk, the fft shape stays the same so scipy reuses its plan
+LOD_FACTOR = 4
+MAX_COLUMNS = 2048  # most columns handed to the image at once
+TOP_DB = 80  # same floor amplitude_to_db uses
+AMIN = 1e-5
+
+
+def stft_chunks(path, n_fft=N_FFT, hop=HOP, chunk_frames=CHUNK_FRAMES):
+    """
+    yields (first column, dB columns) through the file. centred like librosa.stft (n_fft // 2
+    zeros in front), the last n_fft - hop samples of each chunk carry over to the next
+    """
+    window = signal.get_window("hann", n_fft).astype(np.float32)
+    span = (chunk_frames - 1) * hop + n_fft
+    buffer = np.zeros(span, dtype=np.float32)
+    framed = np.empty((chunk_frames, n_fft), dtype=np.float32)
+
+    with sf.SoundFile(str(path)) as f:
+        total = 1 + f.frames // hop
+        filled = n_fft // 2
+        start = 0
+        while start < total:
+            data = f.read(span - filled, dtype="float32", always_2d=True)
+            got = len(data)
+            if data.shape[1] > 1:
+                np.mean(data, axis=1, out=buffer[filled:filled + got])
+            else:
+                buffer[filled:filled + got] = data[:, 0]
+            buffer[filled + got:] = 0  # past the end is silence, same as the padding on the front
+
+            count = min(chunk_frames, total - start)
+            frames = np.lib.stride_tricks.sliding_window_view(buffer, n_fft)[::hop][:count]
+            np.multiply(frames, window, out=framed[:count])
+            magnitude = np.abs(scipy.fft.rfft(framed[:count], axis=1, workers=-1))
+            np.maximum(magnitude, AMIN, out=magnitude)
+            yield start, (20 * np.log10(magnitude)).astype(np.float32)
+
+            start += count
+            carry = span - count * hop
+            buffer[:carry] = buffer[count * hop:].copy()
+            filled = carry
+
+
+class SpectrogramStore:
+    """memory mapped columns, level 0 is every stft frame and each level after is LOD_FACTOR times coarser"""
+
+    def __init__(self, directory, n_columns, n_bins):
+        self.n_columns = n_columns
+        self.levels = []
+        columns, level = n_columns, 0
+        while True:
+            path = Path(directory) / f"level{level}.npy"
+            self.levels.append(np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(columns, n_bins)))
+            if columns <= MAX_COLUMNS:
+                break
+            columns = -(-columns // LOD_FACTOR)
+            level += 1
+        self.done = 0  # level 0 columns written so far
+        self.peak = -np.inf  # loudest column so far, the colour scale hangs off it
+
+    def write(self, start, columns):
+        end = start + len(columns)
+        self.levels[0][start:end] = columns
+        self.peak = max(self.peak, float(columns.max()))
+
+        # redo the coarse columns this chunk touched, the first one may have been partial before.
+        # only written columns go into the max, the rest of the memmap is still zeros (0 dB)
+        first_touched, written = start, end
+        for level in range(1, len(self.levels)):
+            finer, coarse = self.levels[level - 1], self.levels[level]
+            first_touched = first_touched // LOD_FACTOR
+            for column in range(first_touched, -(-written // LOD_FACTOR)):
+                first = column * LOD_FACTOR
+                np.max(finer[first:min(first + LOD_FACTOR, written)], axis=0, out=coarse[column])
+            written = -(-written // LOD_FACTOR)
+        self.done = end  # published last so the viewer never reads a column before its levels are ready
+
+    def view(self, first, last):
+        """(level, first column, columns) for the level 0 range [first, last) at a drawable size"""
+        first = max(0, first)
+        last = min(self.done, last)
+        level = 0
+        while level < len(self.levels) - 1 and (last - first) / LOD_FACTOR ** level > MAX_COLUMNS:
+            level += 1
+        scale = LOD_FACTOR ** level
+        a, b = first // scale, -(-last // scale)
+        return level, a, self.levels[level][a:b]
+
 
 class AudioVisualizer(QMainWindow):
-    def __init__(self):
+    def __init__(self, audio_path):
         super().__init__()
         self.setWindowTitle("Visual Experiment")
         self.resize(800, 400)
@@ -25,36 +127,66 @@ class AudioVisualizer(QMainWindow):
         self.layout.addWidget(self.graph)
 
 
-        script_dir = Path(__file__).parent.resolve()
-        project_root = script_dir.parent
-        audio_path = project_root / 'assets' / 'kewgardens.wav'
-
-
-        waveform, sample_rate = librosa.load(audio_path, sr=None, mono=True)
-
+        info = sf.info(str(audio_path))
+        self.title = f"{Path(audio_path).stem} ({info.frames} samples at {info.samplerate}Hz)"
+        n_columns = 1 + info.frames // HOP
+        n_bins = N_FFT // 2 + 1
 
-        stft = librosa.stft(waveform, n_fft=2048, hop_length=512)
-        spectrogram = librosa.amplitude_to_db(np.abs(stft), ref=np.max)
-
-        self.label.setText(f"Kew Garden ({len(waveform)} samples at {sample_rate}Hz)")
+        self.scratch = tempfile.TemporaryDirectory(prefix="spectrogram-")
+        self.store = SpectrogramStore(self.scratch.name, n_columns, n_bins)
+        self.worker = threading.Thread(target=self.compute, args=(audio_path,), daemon=True)
 
 
         self.img = pg.ImageItem()
         self.graph.addItem(self.img)
 
 
-        self.img.setImage(spectrogram.T)
-
-
         colormap = pg.colormap.get('inferno')
         self.img.setLookupTable(colormap.getLookupTable())
 
         self.graph.setLabel('bottom', "Time Bins")
         self.graph.setLabel('left', "Frequency Bins")
+        self.graph.setXRange(0, n_columns)
+        self.graph.setYRange(0, n_bins)
+        self.graph.sigXRangeChanged.connect(self.refresh)
+
+        self.shown = None
+        self.timer = QTimer(self)
+        self.timer.setInterval(50)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+        self.worker.start()
+
+    def compute(self, audio_path):
+        for start, columns in stft_chunks(audio_path):
+            self.store.write(start, columns)
+
+    def refresh(self):
+        store = self.store
+        (x0, x1), _ = self.graph.viewRange()
+        level, first, columns = store.view(int(x0), int(np.ceil(x1)) + 1)
+
+        key = (level, first, len(columns), store.done)
+        if key == self.shown:
+            return
+        self.shown = key
+
+        progress = store.done / store.n_columns
+        self.label.setText(self.title if progress >= 1 else f"{self.title} {progress:.0%}")
+        if store.done == store.n_columns:
+            self.timer.stop()  # zooming and panning still refresh through sigXRangeChanged
+        if len(columns) == 0:
+            return
+
+        scale = LOD_FACTOR ** level
+        self.img.setImage(np.asarray(columns), autoLevels=False, levels=(store.peak - TOP_DB, store.peak))
+        self.img.setRect(QRectF(first * scale, 0, len(columns) * scale, columns.shape[1]))
 
 
 # Run the App
 app = QApplication(sys.argv)
-window = AudioVisualizer()
+script_dir = Path(__file__).parent.resolve()
+project_root = script_dir.parent
+window = AudioVisualizer(sys.argv[1] if len(sys.argv) > 1 else project_root / 'assets' / 'kewgardens.wav')
 window.show()
-sys.exit(app.exec())
\ No newline at end of file
+sys.exit(app.exec())
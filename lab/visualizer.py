@@ -1,14 +1,25 @@
 import sys
 import numpy as np
 from pathlib import Path
-import librosa
+import soundfile as sf
 import pyqtgraph as pg
 from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QLabel
 
+script_dir = Path(__file__).parent.resolve()
+project_root = script_dir.parent
+sys.path.insert(0, str(project_root / 'src'))
+
+from peaks import load_peaks
+
+"""
+only draws what fits on screen: raw samples when zoomed in, min/max pairs from the
+peak pyramid (see src/peaks.py) when zoomed out, so hour long files stay smooth
+"""
+
 
 class AudioVisualizer(QMainWindow):
 
-    def __init__(self):
+    def __init__(self, audio_path):
         super().__init__()
         self.setWindowTitle("song")
         self.resize(800, 400)
@@ -26,19 +37,32 @@ class AudioVisualizer(QMainWindow):
         self.graph.setBackground('k')
         self.graph.showGrid(x=True, y=True)
         self.layout.addWidget(self.graph)
-        script_dir = Path(__file__).parent.resolve()
-        project_root = script_dir.parent
-        audio_path = project_root / 'assets' / 'kewgardens.wav'
 
-        waveform, sample_rate = librosa.load(audio_path, sr=None, mono = True)
-        self.label.setText(f"Kew Garden ({len(waveform)} samples at {sample_rate}Hz)")
-        self.graph.plot(waveform, pen='c')
+        sample_rate = sf.info(str(audio_path)).samplerate
+        self.peaks = load_peaks(audio_path, sample_rate)  # native rate, decoded + peaks cached on disk
+        self.label.setText(f"{Path(audio_path).stem} ({len(self.peaks)} samples at {sample_rate}Hz)")
+
+        self.curve = self.graph.plot(pen='c')
+        self.shown = None
         self.graph.setMouseEnabled(True,False)
         self.graph.setYRange(-1, 1)
+        self.graph.sigXRangeChanged.connect(self.refresh)
+        self.graph.setXRange(0, len(self.peaks), padding=0)
+        self.refresh()
+
+    def refresh(self):
+        (x0, x1), _ = self.graph.viewRange()
+        # a couple of points per pixel is as much detail as the screen can show
+        max_points = 2 * max(self.graph.width(), 800)
+        x, y = self.peaks.view(int(x0), int(np.ceil(x1)) + 1, max_points)
+        key = (len(x), x[0] if len(x) else None)
+        if key != self.shown:
+            self.shown = key
+            self.curve.setData(x, y)
 
 
 # Run the App
 app = QApplication(sys.argv)
-window = AudioVisualizer()
+window = AudioVisualizer(sys.argv[1] if len(sys.argv) > 1 else project_root / 'assets' / 'kewgardens.wav')
 window.show()
-sys.exit(app.exec())
\ No newline at end of file
+sys.exit(app.exec())
@@ -0,0 +1,129 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from audio_engine import PLAYBACK_RATE, chord_label, midi_to_frequency
+from audio_loader import DECODED_CACHE_DIR, atomic_write, cached_file_hash, load_waveform
+from timeline import ChordTimeline
+
+"""
+works out chords and beats for audio files so the gui has something real to show.
+
+chroma gets computed once for the whole file, averaged between beats, and every beat is
+scored against all the chord templates in one matrix multiply. neighbouring beats with
+the same chord become one timeline event. results get cached next to the decoded audio,
+keyed by the file contents, so opening the same file again skips all of it.
+librosa only gets imported when something actually needs analysing
+"""
+
+ANALYSIS_VERSION = 1  # bump when the output changes so old cache files get ignored
+ANALYSIS_HOP = 1024
+SILENCE_RMS = 1e-3  # quieter beats than this get no chord
+BEAT_SUBDIVISIONS = 2  # chords can change on the off beat, and tempo guesses are often an octave low
+
+CHORD_INTERVALS = {
+    "Maj": (0, 4, 7),
+    "Min": (0, 3, 7),
+    "Dim": (0, 3, 6),
+    "Aug": (0, 4, 8),
+}
+
+
+def _chord_templates():
+    """(templates x 12) unit vectors plus the (root pitch class, quality) of each row"""
+    chords = [(root, quality) for quality in CHORD_INTERVALS for root in range(12)]
+    templates = np.zeros((len(chords), 12))
+    for row, (root, quality) in enumerate(chords):
+        templates[row, [(root + interval) % 12 for interval in CHORD_INTERVALS[quality]]] = 1
+    templates /= np.linalg.norm(templates, axis=1, keepdims=True)
+    return templates, chords
+
+
+TEMPLATES, TEMPLATE_CHORDS = _chord_templates()
+
+
+@dataclass
+class FileAnalysis:
+    timeline: ChordTimeline
+    tempo: float
+    beats: np.ndarray  # beat positions in samples
+
+
+def analyze(waveform, sample_rate=PLAYBACK_RATE):
+    import librosa
+
+    y = np.ascontiguousarray(waveform, dtype=np.float32)
+    tempo, beat_frames = librosa.beat.beat_track(y=y, sr=sample_rate, hop_length=ANALYSIS_HOP)
+    chroma = librosa.feature.chroma_stft(y=y, sr=sample_rate, hop_length=ANALYSIS_HOP, n_fft=4 * ANALYSIS_HOP)
+    rms = librosa.feature.rms(y=y, hop_length=ANALYSIS_HOP, frame_length=4 * ANALYSIS_HOP)
+
+    # one column per half beat, plus the stretch before the first and after the last one
+    if len(beat_frames) > 1:
+        steps = np.diff(beat_frames)[:, None] * np.arange(BEAT_SUBDIVISIONS) // BEAT_SUBDIVISIONS
+        beat_frames_split = (beat_frames[:-1, None] + steps).ravel()
+    else:
+        beat_frames_split = beat_frames
+    bounds = librosa.util.fix_frames(beat_frames_split, x_min=0, x_max=chroma.shape[1])
+    synced = librosa.util.sync(chroma, bounds, aggregate=np.mean)
+    loudness = librosa.util.sync(rms, bounds, aggregate=np.mean)[0]
+
+    norms = np.linalg.norm(synced, axis=0)
+    scores = TEMPLATES @ (synced / np.maximum(norms, 1e-9))
+    best = scores.argmax(axis=0)
+    best[loudness < SILENCE_RMS] = -1
+
+    # a new event whenever the chord changes
+    changes = np.flatnonzero(np.r_[True, best[1:] != best[:-1]])
+    starts = np.minimum(librosa.frames_to_samples(bounds[changes], hop_length=ANALYSIS_HOP), len(y))
+
+    frequencies = np.zeros((len(changes), 3))
+    qualities, labels = [], []
+    for k, template in enumerate(best[changes]):
+        if template < 0:
+            qualities.append("???")
+            labels.append("no chord")
+            continue
+        root, quality = TEMPLATE_CHORDS[template]
+        frequencies[k] = midi_to_frequency(48 + root + np.array(CHORD_INTERVALS[quality]))
+        qualities.append(quality)
+        labels.append(chord_label(quality, *frequencies[k]))
+
+    timeline = ChordTimeline.from_arrays(starts, frequencies, qualities, labels, end=len(y))
+    beats = librosa.frames_to_samples(beat_frames, hop_length=ANALYSIS_HOP)
+    return FileAnalysis(timeline, float(np.atleast_1d(tempo)[0]), beats)
+
+
+def _cache_path(path, sample_rate):
+    return DECODED_CACHE_DIR / f"{cached_file_hash(path)}_{sample_rate}_analysis{ANALYSIS_VERSION}.npz"
+
+
+def cached_analysis(path, sample_rate=PLAYBACK_RATE):
+    """the analysis from an earlier run or None, cheap enough to call on the render worker"""
+    cache_path = _cache_path(path, sample_rate)
+    if not cache_path.exists():
+        return None
+    with np.load(cache_path) as data:
+        timeline = ChordTimeline.from_arrays(
+            data["starts"], data["frequencies"], data["quality_codes"], data["labels"].tolist(),
+            end=int(data["end"]),
+        )
+        return FileAnalysis(timeline, float(data["tempo"]), data["beats"])
+
+
+def analyze_file(path, sample_rate=PLAYBACK_RATE):
+    """analysis for a file, from the cache if the same contents were analysed before"""
+    analysis = cached_analysis(path, sample_rate)
+    if analysis is not None:
+        return analysis
+
+    analysis = analyze(load_waveform(path, sample_rate), sample_rate)
+    timeline = analysis.timeline
+    cache_path = _cache_path(path, sample_rate)
+    try:
+        atomic_write(cache_path, lambda f: np.savez(
+            f, starts=timeline.starts, frequencies=timeline.frequencies,
+            quality_codes=timeline.quality_codes, labels=np.array(timeline.labels, dtype=str),
+            end=timeline.end, tempo=analysis.tempo, beats=analysis.beats))
+    except OSError as e:
+        print(f"Could not cache the analysis for {path}: {e}")
+    return analysis
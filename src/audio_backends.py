@@ -0,0 +1,165 @@
+import threading
+
+import numpy as np
+
+from audio_engine import SAMPLE_DTYPE
+
+"""
+where the player's blocks end up. AudioPlayer only ever calls open/start/stop/close, the
+backend decides who calls the callback and when:
+
+SoundDeviceBackend - the sound card, its audio thread calls back in real time
+NullBackend        - nobody listening, pump() runs the callback as fast as the cpu goes
+WavFileBackend     - same as the null one but every block gets written to a file
+
+the last two run the exact playback path (rate, looping, volume, effects) headless, for
+benchmarks, machines with no audio device, or rendering faster than real time
+"""
+
+
+class OutputBackend:
+    def __init__(self):
+        self.callback = None
+        self.sample_rate = None
+        self.blocksize = None
+        self.channels = 1
+        self.dtype = SAMPLE_DTYPE
+        self.active = False
+
+    def open(self, callback, sample_rate, blocksize, channels=1, dtype=SAMPLE_DTYPE):
+        self.callback = callback
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.channels = channels
+        self.dtype = dtype
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        self.active = False
+
+
+class SoundDeviceBackend(OutputBackend):
+    """the default, sounddevice (and portaudio) only get loaded when a player opens it"""
+
+    def __init__(self, device=None):
+        super().__init__()
+        self.device = device
+        self.stream = None
+
+    def open(self, callback, sample_rate, blocksize, channels=1, dtype=SAMPLE_DTYPE):
+        import sounddevice as sd
+
+        super().open(callback, sample_rate, blocksize, channels, dtype)
+        self.stream = sd.OutputStream(
+            device=self.device,
+            channels=channels,
+            dtype=dtype,
+            blocksize=blocksize,
+            samplerate=sample_rate,
+            callback=callback
+        )
+
+    def start(self):
+        self.stream.start()
+        super().start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+        super().stop()
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        super().close()
+
+
+class NullBackend(OutputBackend):
+    """
+    throws the audio away. pump() calls the callback straight from the calling thread, or
+    with threaded=True start() keeps a thread pumping so it can stand in for a sound card
+    (realtime=True paces that thread to the sample rate instead of going flat out)
+    """
+
+    def __init__(self, threaded=False, realtime=False):
+        super().__init__()
+        self.threaded = threaded
+        self.realtime = realtime
+        self.frames_done = 0
+        self._out = None
+        self._thread = None
+
+    def open(self, callback, sample_rate, blocksize, channels=1, dtype=SAMPLE_DTYPE):
+        super().open(callback, sample_rate, blocksize, channels, dtype)
+        self._out = np.zeros((blocksize, channels), dtype=dtype)
+
+    def start(self):
+        super().start()
+        if self.threaded and self._thread is None:
+            self._thread = threading.Thread(target=self._pump_forever, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        super().stop()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self._thread = None
+
+    def close(self):
+        self.stop()
+
+    def pump(self, frames):
+        """runs the callback for exactly frames samples, a block at a time with a short one last"""
+        for start in range(0, frames, self.blocksize):
+            self._block(min(self.blocksize, frames - start))
+        return max(frames, 0)
+
+    def _block(self, frames=None):
+        frames = self.blocksize if frames is None else frames
+        out = self._out[:frames]
+        self.callback(out, frames, None, None)
+        self.frames_done += frames
+        self.write(out)
+
+    def write(self, block):
+        pass
+
+    def _pump_forever(self):
+        clock = threading.Event()
+        seconds = self.blocksize / self.sample_rate
+        while self.active:
+            self._block()
+            if self.realtime:
+                clock.wait(seconds)
+
+
+class WavFileBackend(NullBackend):
+    """NullBackend that writes everything it pumps to path"""
+
+    def __init__(self, path, subtype="FLOAT", threaded=False, realtime=False):
+        super().__init__(threaded, realtime)
+        self.path = path
+        self.subtype = subtype
+        self._file = None
+
+    def open(self, callback, sample_rate, blocksize, channels=1, dtype=SAMPLE_DTYPE):
+        import soundfile as sf
+
+        super().open(callback, sample_rate, blocksize, channels, dtype)
+        self._file = sf.SoundFile(str(self.path), "w", samplerate=sample_rate, channels=channels,
+                                  subtype=self.subtype)
+
+    def write(self, block):
+        self._file.write(block)
+
+    def close(self):
+        super().close()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,30 +1,102 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from tkinter.filedialog import askopenfilename
 
-from audio_loader import load_wav_file
-from audio_engine import chord_player, apply_downsample, apply_flanger
+import soundfile as sf
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtWidgets import QFileDialog
+
+from analysis import analyze_file, cached_analysis
+from audio_loader import cached_file_hash, load_wav_file
+from audio_engine import chord_player
+from audio_stream import ChordStream, FileStream
+from library import AUDIO_SUFFIXES, SampleLibrary
+from midi import MIDI_SUFFIXES
+from render_graph import RenderGraph, midi_source
+from timeline import ChordTimeline
+
+# files longer than this play straight off the disk instead of being loaded whole
+STREAM_FILES_LONGER_THAN = 10 * 60
+FILE_FILTER = ";;".join([
+    "Audio / MIDI files (" + " ".join(f"*{suffix}" for suffix in AUDIO_SUFFIXES + MIDI_SUFFIXES) + ")",
+    "Audio files (" + " ".join(f"*{suffix}" for suffix in AUDIO_SUFFIXES) + ")",
+    "MIDI files (" + " ".join(f"*{suffix}" for suffix in MIDI_SUFFIXES) + ")",
+])
 
 
 @dataclass
 class PlaybackResult:
     """the singular playback buffer and its infos"""
     audio_buffer: object
-    chord_data: list
-    samples_per_chord: int
+    timeline: ChordTimeline
     info_text: str
+    stream: object = None
+    analyze_path: object = None  # file to analyse in the background once it's playing
+    show_quality: bool = False  # info text gets the live downsample rate on the end
+
+
+@dataclass(frozen=True)
+class RenderRequest:
+    """snapshot of the widgets so the render can run off the gui thread"""
+    bpm: int
+    root: int
+    root_name: str
+    scale: str
+    wave: str
+    endless: bool
+    filepath: object
+    paused: bool = False
+
+
+def _file_duration(path):
+    try:
+        return sf.info(str(path)).duration
+    except RuntimeError:
+        return 0.0
 
 
-class PlaybackController:
+class PlaybackController(QObject):
+    # (render id, (request, PlaybackResult or the exception the render raised))
+    render_finished = pyqtSignal(int, object)
+    # (render id, (PlaybackResult, FileAnalysis or the exception it raised))
+    analysis_finished = pyqtSignal(int, object)
+    # (files read, files to read) while a library scan runs
+    library_progress = pyqtSignal(int, int)
+    # list of ScanSummary, or the exception the scan raised
+    library_scanned = pyqtSignal(object)
+
     def __init__(self, main_window):
+        super().__init__()
         self.view = main_window
         self.current_filepath = None
 
+        # one worker, and while it's busy only the newest request waits for it (see start_playback)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+        self._pending = None
+        self._queued = None
+        self._render_id = 0
+        self._playing = None  # PlaybackResult the player has right now
+        self._graph = RenderGraph()
+        self.is_rendering = False
+        self.render_finished.connect(self._on_render_finished)
+
+        # analysis gets its own worker so a long file never holds up the next render
+        self._analysis_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analysis")
+        self._analysis = None
+        self.analysis_finished.connect(self._on_analysis_finished)
+
+        # the scan itself fans out to a process pool, this thread just waits on it
+        self.library = SampleLibrary()
+        self._library_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="library")
+        self._library_scan = None
+
     def select_file(self):
-        filename = askopenfilename(filetypes=[("WAV files", "*.wav")])
-        if not filename:
-            return
+        filename, _ = QFileDialog.getOpenFileName(self.view, "Load File", "", FILE_FILTER)
+        if filename:
+            self.open_file(filename)
 
+    def open_file(self, filename):
+        """switches to "play file" with filename, from the file dialog or the library"""
         self.current_filepath = filename
         combo = self.view.wave_combo
         index = combo.findText("play file")
@@ -33,60 +105,200 @@ class PlaybackController:
             combo.setCurrentIndex(index)
             combo.blockSignals(False)
 
-        self.view.info_label.setText(f"File Ready: {Path(filename).stem}")
+        self.view.set_info(f"File Ready: {Path(filename).stem}")
         self.view.force_play()
 
-    def build_playback(self, keep_position):
-        """Generating or loading the audio for the current settings but liek it  doesnt
-        touch the player or view states"""
-        bpm = self.view.bpm_input.value()
-        root = self.view.root_combo.currentIndex()
-        scale = self.view.scale_combo.currentText()
+    def _snapshot_request(self, paused):
         wave = self.view.wave_combo.currentText()
 
-        slider = self.view.downsample_slider.value()
-        downsample_rate = None if slider > 44000 else slider
-
         if wave == "play file":
             if self.current_filepath is None:
+                # picking a file kicks off its own playback
                 self.select_file()
-                if self.current_filepath is None:
-                    return None
+                return None
+        else:
+            self.current_filepath = None
+
+        return RenderRequest(
+            bpm=self.view.bpm_input.value(),
+            root=self.view.root_combo.currentIndex(),
+            root_name=self.view.root_combo.currentText(),
+            scale=self.view.scale_combo.currentText(),
+            wave=wave,
+            endless=self.view.endless_button.isChecked(),
+            filepath=self.current_filepath,
+            paused=paused,
+        )
 
-            audio_buffer, chord_data = load_wav_file(self.current_filepath)
-            if downsample_rate:
-                audio_buffer = apply_downsample(audio_buffer, downsample_rate)
+    def build_playback(self, request):
+        """Generating or loading the audio for the current settings but liek it  doesnt
+        touch the player or view states, runs on the render worker"""
+        bpm, scale, wave = request.bpm, request.scale, request.wave
+        key_name = f"{request.root_name} {scale}"
 
-            samples_per_chord = len(audio_buffer)
-            info_text = f"Playing File: {Path(self.current_filepath).stem}"
+        if wave == "play file" and Path(request.filepath).suffix.lower() in MIDI_SUFFIXES:
+            # every channel gets its own oscillator, see midi.CHANNEL_SHAPES
+            audio_buffer, timeline = self._graph.render(
+                [("midi", midi_source, (request.filepath, cached_file_hash(request.filepath)))])
+            info_text = f"Playing MIDI: {Path(request.filepath).stem}"
+        elif wave == "play file" and _file_duration(request.filepath) > STREAM_FILES_LONGER_THAN:
+            stream = FileStream(request.filepath)
+            timeline = ChordTimeline.single(f"{Path(request.filepath).stem} File", stream.length)
+            info_text = f"Streaming File: {Path(request.filepath).stem}"
+            return PlaybackResult(None, timeline, info_text, stream)
+        elif wave == "play file":
+            audio_buffer, timeline = load_wav_file(request.filepath)
+            info_text = f"Playing File: {Path(request.filepath).stem}"
+            analysis = cached_analysis(request.filepath)
+            if analysis is None:
+                return PlaybackResult(audio_buffer, timeline, info_text, analyze_path=request.filepath)
+            timeline = analysis.timeline
+            info_text += f" ({analysis.tempo:.0f} BPM)"
+        elif request.endless:
+            # rendered a chord at a time while it plays so it never has to end
+            stream = ChordStream(bpm, request.root, scale, wave)
+            info_text = f"Playing {key_name} | {wave} | Endless"
+            return PlaybackResult(None, stream.timeline, info_text, stream)
         else:
-            self.current_filepath = None
-            audio_buffer, chord_data = chord_player(
-                32, bpm, root, scale, wave,
-                downsample_rate=downsample_rate
+            # downsampling happens live in the player now so it can change mid song
+            audio_buffer, timeline = chord_player(
+                32, bpm, request.root, scale, wave,
+                downsample_rate=None
             )
-            samples_per_chord = int((60.0 / bpm) * 44100)
+            info_text = f"Playing {key_name} | {wave}"
+            return PlaybackResult(audio_buffer, timeline, info_text, show_quality=True)
+
+        return PlaybackResult(audio_buffer, timeline, info_text)
 
-            quality_text = "Clean" if downsample_rate is None else f"{downsample_rate}Hz"
-            key_name = f"{self.view.root_combo.currentText()} {scale}"
-            info_text = f"Playing {key_name} | {wave} | {quality_text}"
+    def _downsample_rate(self):
+        slider = self.view.downsample_slider.value()
+        return None if slider > 44000 else slider
 
-        if self.view.flanger_button.isChecked():
-            current_rate = self.view.flanger_rate_slider.value() / 10.0
-            current_depth = self.view.flanger_depth_slider.value() / 1000.0
-            audio_buffer = apply_flanger(audio_buffer, lfo_rate=current_rate, depth=current_depth)
+    def _info_text(self, result):
+        """result's info text, with whatever rate the downsampler is on right now if it shows one"""
+        if not result.show_quality:
+            return result.info_text
+        rate = self._downsample_rate()
+        return f"{result.info_text} | {'Clean' if rate is None else f'{rate}Hz'}"
 
-        return PlaybackResult(audio_buffer, chord_data, samples_per_chord, info_text)
+    def update_effects(self):
+        """pushes the fx tab settings to the player, these run per block so no re-render needed"""
+        self.view.player.set_downsample(self._downsample_rate())
+        self.view.player.set_flanger(
+            self.view.flanger_button.isChecked(),
+            lfo_rate=self.view.flanger_rate_slider.value() / 10.0,
+            depth=self.view.flanger_depth_slider.value() / 1000.0,
+        )
+        playing = self._playing
+        if playing is not None and playing.show_quality and not self.is_rendering:
+            self.view.set_info(self._info_text(playing))
 
-    def start_playback(self, keep_position=False):
-        result = self.build_playback(keep_position)
-        if result is None:
+    def start_playback(self, paused=False):
+        """queues a render, the player gets the result once its done (see _on_render_finished)"""
+        request = self._snapshot_request(paused)
+        if request is None:
             return
 
-        self.view.chord_data = result.chord_data
-        self.view.samples_per_chord = result.samples_per_chord
-        self.view.info_label.setText(result.info_text)
-        if keep_position and self.view.player.buffer_length > 0:
-            self.view.player.update_buffer(result.audio_buffer)
+        self._render_id += 1
+        self.is_rendering = True
+        self.view.set_info("Rendering…")
+
+        if self._pending is not None and not self._pending.done():
+            # whatever is rendering is out of date already, only the newest request runs after it
+            self._queued = (self._render_id, request)
+            return
+        self._submit(self._render_id, request)
+
+    def _submit(self, render_id, request):
+        self._queued = None
+        self._pending = self._executor.submit(self.build_playback, request)
+        self._pending.add_done_callback(lambda future: self._emit_result(render_id, request, future))
+
+    def _emit_result(self, render_id, request, future):
+        # runs on the worker thread, the signal hops the result over to the gui thread
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            result = e
+        self.render_finished.emit(render_id, (request, result))
+
+    def _on_render_finished(self, render_id, payload):
+        if self._queued is not None and self._pending.done():
+            self._submit(*self._queued)  # this result is stale, the newest request goes next
+            return
+
+        request, result = payload
+        if render_id != self._render_id:
+            # something newer got requested while this one was rendering
+            return
+
+        self.is_rendering = False
+        self._pending = None
+        if isinstance(result, Exception):
+            self.view.set_info(f"Render failed: {result}")
+            return
+
+        self._playing = result
+        self.update_effects()
+
+        self.view.timeline = result.timeline
+        self.view.set_info(self._info_text(result))
+        if result.stream is not None:
+            self.view.player.play_stream(result.stream)
         else:
-            self.view.player.play(result.audio_buffer)
\ No newline at end of file
+            self.view.player.play(result.audio_buffer)
+
+        if request.paused:
+            self.view.player.is_playing = False
+
+        if result.analyze_path is not None:
+            self._start_analysis(render_id, result)
+
+    def _start_analysis(self, render_id, result):
+        if self._analysis is not None:
+            self._analysis.cancel()
+        self.view.set_info(f"{result.info_text} (analysing…)")
+        self._analysis = self._analysis_executor.submit(analyze_file, result.analyze_path)
+        self._analysis.add_done_callback(lambda future: self._emit_analysis(render_id, result, future))
+
+    def _emit_analysis(self, render_id, result, future):
+        if future.cancelled():
+            return
+        try:
+            analysis = future.result()
+        except Exception as e:
+            analysis = e
+        self.analysis_finished.emit(render_id, (result, analysis))
+
+    def _on_analysis_finished(self, render_id, payload):
+        result, analysis = payload
+        if render_id != self._render_id or self.is_rendering:
+            return  # something else is playing by now, the cache still has it for next time
+        if isinstance(analysis, Exception):
+            self.view.set_info(f"{result.info_text} (analysis failed: {analysis})")
+            return
+        self.view.timeline = analysis.timeline
+        self.view.set_info(f"{result.info_text} ({analysis.tempo:.0f} BPM)")
+
+    def add_library_folder(self):
+        folder = QFileDialog.getExistingDirectory(self.view, "Add Folder to Library")
+        if folder:
+            self._scan_library(lambda progress: [self.library.scan(folder, progress=progress)])
+
+    def rescan_library(self):
+        self._scan_library(lambda progress: self.library.rescan(progress=progress))
+
+    def _scan_library(self, scan):
+        if self._library_scan is not None and not self._library_scan.done():
+            return  # one at a time, the next rescan picks up whatever this one missed
+        self._library_scan = self._library_executor.submit(scan, self.library_progress.emit)
+        self._library_scan.add_done_callback(self._emit_library_scanned)
+
+    def _emit_library_scanned(self, future):
+        try:
+            result = future.result()
+        except Exception as e:
+            result = e
+        self.library_scanned.emit(result)
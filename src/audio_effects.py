@@ -0,0 +1,395 @@
+import numpy as np
+
+from audio_engine import SAMPLE_DTYPE, Interpolator
+
+"""
+Block based versions of the effects so they can run inside the audio callback.
+Each effect keeps whatever state it needs between blocks (delay line, lfo phase,
+held sample...) so changing a knob only affects the next block instead of
+re-rendering the whole buffer
+
+process() works on the block in place and all the scratch arrays get made up front
+in prepare(), so once the player is running the effects never allocate
+"""
+
+
+class Effect:
+    def __init__(self, sample_rate=44100, max_frames=1024):
+        self.sample_rate = sample_rate
+        self.enabled = False
+        self.max_frames = 0
+        self.prepare(max_frames)
+
+    def prepare(self, max_frames):
+        """allocate scratch space for blocks up to max_frames long"""
+        self.max_frames = max_frames
+        self._steps = np.arange(max_frames, dtype=np.float64)
+
+    def process(self, block):
+        """processes a 1d block in place and returns it"""
+        return block
+
+    def reset(self):
+        pass
+
+
+class DelayLine:
+    """
+    the ring buffer the flanger and pitch shifter read behind. a power of two long so
+    wrapping is just a mask, with room for reach samples of history on top of a block
+    """
+
+    def __init__(self, reach, max_frames):
+        size = 1 << int(np.ceil(np.log2(reach + max_frames)))
+        self.line = np.zeros(size, dtype=SAMPLE_DTYPE)
+        self.wrap = size - 1
+        self.write = 0
+        self._lerp = Interpolator(max_frames)
+
+    def reset(self):
+        self.line.fill(0)
+        self.write = 0
+
+    def push(self, block):
+        """writes block in, returns where in the ring it starts"""
+        n = len(block)
+        start = self.write
+        first = min(n, len(self.line) - start)
+        self.line[start:start + first] = block[:first]
+        self.line[:n - first] = block[first:]
+        self.write = (start + n) & self.wrap
+        return start
+
+    def copy(self, start, out):
+        """len(out) samples from ring position start (wrapped here) on, no interpolation"""
+        start &= self.wrap
+        first = min(len(out), len(self.line) - start)
+        out[:first] = self.line[start:start + first]
+        out[first:] = self.line[:len(out) - first]
+        return out
+
+    def read(self, indices, out):
+        """linear interpolation at ring positions indices (not wrapped yet) into out"""
+        return self._lerp.lerp_into(self.line, indices, out, wrap=True)
+
+
+class Downsampler(Effect):
+    """
+    sample and hold version of apply_downsample, picks the same source sample
+    for each step as the full buffer version does, just a block at a time
+    """
+
+    def __init__(self, sample_rate=44100, max_frames=1024):
+        self.target_rate = None
+        super().__init__(sample_rate, max_frames)
+        self.reset()
+
+    def prepare(self, max_frames):
+        super().prepare(max_frames)
+        self._positions = np.empty(max_frames)
+        self._source = np.empty(max_frames, dtype=np.int64)
+        self._mask = np.empty(max_frames, dtype=bool)
+        self._out = np.empty(max_frames, dtype=SAMPLE_DTYPE)
+
+    def set_rate(self, target_rate):
+        if not target_rate or target_rate >= self.sample_rate:
+            self.enabled = False
+            return
+        self.target_rate = target_rate
+        self.enabled = True
+
+    def reset(self):
+        self._offset = 0  # how many samples went through so far
+        self._held = 0.0
+        self._last = 0.0
+
+    def process(self, block):
+        n = len(block)
+        if n == 0:
+            return block
+        if not self.enabled:
+            self._offset += n
+            self._last = block[n - 1]
+            self._held = block[n - 1]
+            return block
+        if n > self.max_frames:
+            self.prepare(n)
+
+        step_size = self.sample_rate / self.target_rate
+        # source = floor(floor(sample_index / step) * step), relative to this block
+        positions = self._positions[:n]
+        np.add(self._steps[:n], self._offset, out=positions)
+        positions /= step_size
+        np.floor(positions, out=positions)
+        positions *= step_size
+        np.floor(positions, out=positions)
+        positions -= self._offset
+        source = self._source[:n]
+        np.copyto(source, positions, casting="unsafe")
+
+        # the held sample can live in an earlier block, -1 is the very last one we saw
+        out = self._out[:n]
+        np.take(block, source, out=out, mode="clip")
+        mask = self._mask[:n]
+        np.equal(source, -1, out=mask)
+        np.copyto(out, self._last, where=mask)
+        np.less(source, -1, out=mask)
+        np.copyto(out, self._held, where=mask)
+
+        self._offset += n
+        self._last = block[n - 1]
+        self._held = out[n - 1]
+        np.copyto(block, out)
+        return block
+
+
+class Flanger(Effect):
+    """
+    same maths as apply_flanger but the delay line and lfo phase carry over
+    between blocks
+    """
+
+    MAX_DEPTH = 0.02  # the depth slider tops out at 20 ms
+
+    def __init__(self, sample_rate=44100, lfo_rate=0.5, depth=0.004, max_frames=1024):
+        self.lfo_rate = lfo_rate
+        self.depth = depth
+        # +2 so the linear interpolation always has both neighbours
+        self._history_len = int(self.MAX_DEPTH * sample_rate) + 2
+        super().__init__(sample_rate, max_frames)
+        self.reset()
+
+    def prepare(self, max_frames):
+        super().prepare(max_frames)
+        self._ring = DelayLine(self._history_len, max_frames)
+        self._delay = np.empty(max_frames)
+        self._reach = np.empty(max_frames)
+        self._silent = np.empty(max_frames, dtype=bool)
+        self._delayed = np.empty(max_frames, dtype=SAMPLE_DTYPE)
+
+    def set_params(self, lfo_rate=None, depth=None):
+        if lfo_rate is not None:
+            self.lfo_rate = lfo_rate
+        if depth is not None:
+            self.depth = min(depth, self.MAX_DEPTH)
+
+    def reset(self):
+        self._ring.reset()
+        self._position = 0  # samples processed, anything before 0 is silence
+        self._phase = 0.0   # lfo phase in cycles
+
+    def _push(self, block):
+        self._position += len(block)
+        return self._ring.push(block)
+
+    def process(self, block):
+        n = len(block)
+        if n == 0:
+            return block
+        if not self.enabled:
+            self._push(block)
+            return block
+        if n > self.max_frames:
+            self.prepare(n)  # loses the delay line, only happens if blocks suddenly get bigger
+
+        steps = self._steps[:n]
+        delay = self._delay[:n]
+        np.multiply(steps, self.lfo_rate / self.sample_rate, out=delay)
+        delay += self._phase
+        delay *= 2 * np.pi
+        np.sin(delay, out=delay)
+        delay += 1
+        delay *= 0.5 * self.depth * self.sample_rate  # lfo (0..1) * max delay in samples
+
+        # right after a reset the delay reaches back before the first sample, thats silence
+        silent = None
+        if self._position < self._history_len:
+            reach = self._reach[:n]
+            np.add(steps, self._position, out=reach)
+            reach -= delay
+            silent = self._silent[:n]
+            np.less(reach, 0, out=silent)
+
+        start = self._push(block)
+
+        # read position in the ring, + size keeps it positive before masking
+        indices = delay
+        np.subtract(steps, delay, out=indices)
+        indices += start + len(self._ring.line)
+        delayed = self._ring.read(indices, self._delayed[:n])
+        if silent is not None:
+            np.copyto(delayed, 0, where=silent)
+
+        self._phase = (self._phase + n * self.lfo_rate / self.sample_rate) % 1.0
+        block += delayed
+        block *= SAMPLE_DTYPE(0.5)
+        return block
+
+
+class PitchShifter(Effect):
+    """
+    shifts pitch without touching the tempo, so the player's speed and pitch can move
+    separately. its wsola: every HOP samples a grain gets read out of the recent input
+    at the pitch ratio and overlap added under a hann window. each grain's start gets
+    moved (up to SEARCH samples) to wherever the input best lines up, by cross correlation,
+    with where the previous grain would have carried on, so the waveform runs on through
+    every splice and the pitch comes out exact instead of smeared over sidebands.
+    one correlation and one interpolated read per grain, no ffts
+    """
+
+    GRAIN = 2048  # output samples per grain, about 46 ms at 44.1k
+    HOP = GRAIN // 2  # hann grains half overlapped add up to exactly 1
+    SEARCH = 512  # how far a splice can move either way, enough for a full period down to ~43 Hz
+    CORRELATION = 512  # samples compared when lining a splice up
+    MIN_RATIO = 0.125
+    MAX_RATIO = 8.0
+
+    def __init__(self, sample_rate=44100, max_frames=1024):
+        self.ratio = 1.0
+        super().__init__(sample_rate, max_frames)
+        self.reset()
+
+    def prepare(self, max_frames):
+        super().prepare(max_frames)
+        # a grain or a splice search reaches at most this far back from the newest sample
+        reach = int(self.MAX_RATIO * self.GRAIN) + self.HOP + 3 * self.SEARCH + max_frames + 8
+        self._ring = DelayLine(reach, max(max_frames, self.GRAIN))
+        self._grain_steps = np.arange(self.GRAIN, dtype=np.float64)
+        self._window = np.square(np.sin(np.pi * self._grain_steps / self.GRAIN)).astype(SAMPLE_DTYPE)
+        self._indices = np.empty(self.GRAIN)
+        self._grain = np.empty(self.GRAIN, dtype=SAMPLE_DTYPE)
+
+        # output still to be played, a grain starting at time t gets added in at t & mask
+        size = 1 << int(np.ceil(np.log2(self.GRAIN + max_frames)))
+        self._overlap = np.zeros(size, dtype=SAMPLE_DTYPE)
+        self._overlap_wrap = size - 1
+
+        candidates = 2 * self.SEARCH + 2
+        self._reference = np.empty(self.CORRELATION)
+        self._segment = np.empty(self.CORRELATION + candidates - 1)
+        self._windows = np.lib.stride_tricks.sliding_window_view(self._segment, self.CORRELATION)
+        self._squares = np.empty(len(self._segment))
+        self._energy = np.zeros(len(self._segment) + 1)  # running sum of squares, [0] stays 0
+        self._scores = np.empty(candidates)
+        self._norms = np.empty(candidates)
+
+    def set_ratio(self, ratio):
+        """pitch ratio on top of whatever the playback speed does, 1.0 switches it off"""
+        self.ratio = float(np.clip(ratio, self.MIN_RATIO, self.MAX_RATIO))
+        self.enabled = abs(self.ratio - 1.0) > 1e-6
+
+    def reset(self):
+        self._ring.reset()
+        self._position = 0  # samples pushed so far, the ring slot of sample t is t & wrap
+        self._next_grain = None  # output time of the next grain, None starts over from silence
+        self._carry_on = None  # input position the last grain would have reached by then
+
+    def _align(self, nominal):
+        """grain start within SEARCH of nominal that best carries on from the last grain"""
+        carry = self._carry_on
+        if carry is None:
+            return nominal
+        # candidates keep carry's fraction, so only whole sample offsets need comparing
+        base = int(np.floor(carry))
+        first = int(np.ceil(nominal - self.SEARCH - carry))
+        count = int(np.floor(nominal + self.SEARCH - carry)) - first + 1
+        reference = self._ring.copy(base, self._reference)
+        segment = self._ring.copy(base + first, self._segment[:self.CORRELATION + count - 1])
+
+        scores = self._scores[:count]
+        np.matmul(self._windows[:count], reference, out=scores)
+        # divided by each candidate's level so a louder stretch doesn't win just for being loud
+        squares = self._squares[:len(segment)]
+        np.square(segment, out=squares)
+        energy = self._energy[:len(segment) + 1]
+        np.cumsum(squares, out=energy[1:])
+        norms = self._norms[:count]
+        np.subtract(energy[self.CORRELATION:], energy[:count], out=norms)
+        np.maximum(norms, 1e-12, out=norms)
+        np.sqrt(norms, out=norms)
+        scores /= norms
+
+        best = int(np.argmax(scores))
+        offset = float(best)
+        if 0 < best < count - 1:
+            # parabola through the peak and its neighbours puts the splice between samples
+            left, middle, right = scores[best - 1], scores[best], scores[best + 1]
+            curve = left - 2 * middle + right
+            if curve < 0:
+                offset += 0.5 * (left - right) / curve
+        return carry + first + offset
+
+    def _add_grain(self, time):
+        ratio = self.ratio
+        # far enough back that the whole grain and every candidate is already in the ring
+        span = max(ratio * self.GRAIN, self.CORRELATION)
+        start = self._align(time - span - self.SEARCH - 2)
+
+        indices = self._indices
+        np.multiply(self._grain_steps, ratio, out=indices)
+        indices += start + len(self._ring.line)
+        grain = self._ring.read(indices, self._grain)
+        grain *= self._window
+
+        offset = time & self._overlap_wrap
+        first = min(self.GRAIN, len(self._overlap) - offset)
+        self._overlap[offset:offset + first] += grain[:first]
+        self._overlap[:self.GRAIN - first] += grain[first:]
+        self._carry_on = start + ratio * self.HOP
+        self._next_grain = time + self.HOP
+
+    def process(self, block):
+        n = len(block)
+        if n == 0:
+            return block
+        if not self.enabled:
+            self._ring.push(block)
+            self._position += n
+            self._next_grain = None
+            return block
+        if n > self.max_frames:
+            self.prepare(n)
+            self.reset()
+
+        now = self._position
+        self._ring.push(block)
+        self._position += n
+        if self._next_grain is None:
+            self._overlap.fill(0)
+            self._carry_on = None
+            self._next_grain = now
+        while self._next_grain < now + n:
+            self._add_grain(self._next_grain)
+
+        offset = now & self._overlap_wrap
+        first = min(n, len(self._overlap) - offset)
+        played = self._overlap[offset:offset + first], self._overlap[:n - first]
+        block[:first] = played[0]
+        block[first:] = played[1]
+        for part in played:
+            part.fill(0)
+        return block
+
+
+class EffectChain:
+    """runs the effects in order, pitch first and then the order build_playback used (downsample -> flanger)"""
+
+    def __init__(self, sample_rate=44100, max_frames=1024):
+        self.pitch = PitchShifter(sample_rate, max_frames)
+        self.downsampler = Downsampler(sample_rate, max_frames)
+        self.flanger = Flanger(sample_rate, max_frames=max_frames)
+        self.effects = [self.pitch, self.downsampler, self.flanger]
+
+    def prepare(self, max_frames):
+        for effect in self.effects:
+            effect.prepare(max_frames)
+        self.reset()
+
+    def process(self, block):
+        for effect in self.effects:
+            block = effect.process(block)
+        return block
+
+    def reset(self):
+        for effect in self.effects:
+            effect.reset()
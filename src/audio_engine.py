@@ -1,38 +1,173 @@
 import numpy as np
-from scipy import signal
-import random
+from functools import lru_cache
+
+from timeline import ChordTimeline
 
 """
 dealing with some DSP on this file
+
+dtype policy: every buffer that holds audio is SAMPLE_DTYPE (float32, same as the output
+stream). only phases / time axes stay float64 because float32 runs out of precision
+after a few seconds worth of samples
 """
 PLAYBACK_RATE = 44100
+SAMPLE_DTYPE = np.float32
+
+
+class Interpolator:
+    """
+    linear interpolation that owns its scratch, for the audio callback path. everything
+    is out= from preallocated arrays, they only get regrown if the blocks get bigger
+    """
+
+    def __init__(self, max_frames=0):
+        self.prepare(max_frames)
+
+    def prepare(self, max_frames):
+        self._floors = np.empty(max_frames)
+        self._fractions64 = np.empty(max_frames)
+        self._i = np.empty(max_frames, dtype=np.int64)
+        self._j = np.empty(max_frames, dtype=np.int64)
+        self._fractions = np.empty(max_frames, dtype=SAMPLE_DTYPE)
+        self._upper = np.empty(max_frames, dtype=SAMPLE_DTYPE)
+
+    def lerp_into(self, source, positions, out, length=None, wrap=False, gather=None):
+        """
+        out[k] = source at positions[k]. with wrap both neighbours are taken modulo length
+        (ring buffers, looping), otherwise the upper one is held at length - 1. length
+        defaults to len(source). gather(indices, out) replaces the lookup into source,
+        for sources that aren't one array
+        """
+        n = len(positions)
+        if n > len(self._i):
+            self.prepare(n)
+        length = len(source) if length is None else length
+
+        # floor as floats so the subtract below never mixes int and float (that needs a cast buffer)
+        floors = self._floors[:n]
+        np.floor(positions, out=floors)
+        i, j = self._i[:n], self._j[:n]
+        np.copyto(i, floors, casting="unsafe")
+        np.add(i, 1, out=j)
+        if wrap:
+            np.remainder(i, length, out=i)
+            np.remainder(j, length, out=j)
+        else:
+            np.minimum(j, length - 1, out=j)
+
+        fractions64 = self._fractions64[:n]
+        np.subtract(positions, floors, out=fractions64)
+        fractions = self._fractions[:n]
+        np.copyto(fractions, fractions64, casting="same_kind")
+
+        upper = self._upper[:n]
+        if gather is None:
+            # mode="clip" keeps take from buffering, the indices are already in range
+            np.take(source, i, out=out, mode="clip")
+            np.take(source, j, out=upper, mode="clip")
+        else:
+            gather(i, out)
+            gather(j, upper)
+        upper -= out
+        upper *= fractions
+        out += upper
+        return out
 
 
 def white_noise(frequency, duration, amplitude=0.3, sample_rate=PLAYBACK_RATE):
     n_samples = int(duration * sample_rate)
-    noise = np.random.uniform(-1, 1, n_samples)
+    noise = np.random.uniform(-1, 1, n_samples).astype(SAMPLE_DTYPE)
     noise *= amplitude
     return noise
 
+WAVETABLE_CACHE_SIZE = 32  # one table per (shape, sample rate), the downsample slider makes lots of rates
+
+
+def _table_size(sample_rate):
+    # the power of two at or above the samples in one 20Hz cycle (sample_rate / 20), clamped
+    # to 256..4096 points. 4096 at 44.1k, 256 once a downsample rate drops to 5.1k or below.
+    # so a 20Hz note steps at least one entry a sample, except above 81.92k where the cap wins
+    return int(np.clip(2 ** np.ceil(np.log2(sample_rate / 20)), 256, 4096))
+
+
+@lru_cache(maxsize=WAVETABLE_CACHE_SIZE)
+def _wavetable(shape, sample_rate):
+    """
+    a single cycle of the waveform, with the first sample repeated at the end so
+    the interpolation never has to wrap
+    """
+    from scipy import signal  # only needed the first time a table gets built, keeps startup quick
+
+    size = _table_size(sample_rate)
+    phase = 2 * np.pi * np.arange(size + 1) / size
+    if shape == "sine":
+        table = np.sin(phase)
+    elif shape == "square":
+        table = np.sign(np.sin(phase))
+    elif shape == "triangle":
+        table = signal.sawtooth(phase, 0.5)
+    elif shape == "saw":
+        table = signal.sawtooth(phase, 1)
+    else:
+        raise ValueError(f"Unknown wavetable shape {shape!r}")
+    table[-1] = table[0]
+    table = table.astype(SAMPLE_DTYPE)
+    table.setflags(write=False)  # shared between every note through the cache
+    return table
+
+
+def _table_phase(steps, increment, table_size):
+    """
+    where in a table each sample lands, steps samples in at increment table points a sample.
+    table_size is a power of two so this wraps exactly like % does, just quicker
+    """
+    phase = steps * increment
+    phase -= np.floor(phase * (1.0 / table_size)) * table_size
+    return phase
+
+
+def _table_lookup(table, phase, offset=0):
+    """
+    linear interpolation into table at phase (0 <= phase < table size). offset moves the
+    reads along, for several tables packed one after another into one array
+    """
+    i = phase.astype(np.int64)
+    fractions = (phase - i).astype(SAMPLE_DTYPE)
+    i += offset
+    lower = table[i]
+    return lower + (table[i + 1] - lower) * fractions
+
+
+def wavetable_tone(shape, frequency, duration, amplitude=0.3, sample_rate=PLAYBACK_RATE):
+    """
+    plays a cached single cycle table at the given frequency, the phase just walks
+    through the table so its a lookup per sample instead of a sin() per sample
+    """
+    table = _wavetable(shape, sample_rate)
+    size = len(table) - 1
+    n_samples = int(sample_rate * duration)
+
+    phase = _table_phase(np.arange(n_samples), frequency * size / sample_rate, size)
+    return _table_lookup(table, phase) * SAMPLE_DTYPE(amplitude)
+
+
 def sine_tone(frequency, duration, amplitude=0.3, sample_rate=PLAYBACK_RATE):
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    return np.sin(2 * np.pi * frequency * t) * amplitude
+    return wavetable_tone("sine", frequency, duration, amplitude, sample_rate)
 
 
 def square_tone(frequency, duration, amplitude=0.3, sample_rate=PLAYBACK_RATE):
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    return np.sign(np.sin(2 * np.pi * frequency * t)) * amplitude
+    return wavetable_tone("square", frequency, duration, amplitude, sample_rate)
 
 
 def triangle_tone(frequency, duration, amplitude=0.3, sample_rate=PLAYBACK_RATE):
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    return signal.sawtooth(2 * np.pi * frequency * t, 0.5) * amplitude
+    return wavetable_tone("triangle", frequency, duration, amplitude, sample_rate)
 
 
 def saw_tone(frequency, duration, amplitude=0.3, sample_rate=PLAYBACK_RATE):
-    t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-    return signal.sawtooth(2 * np.pi * frequency * t, 1) * amplitude
+    return wavetable_tone("saw", frequency, duration, amplitude, sample_rate)
+
 
+NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
 
 SCALE_INTERVALS = {
     # major is WWHWWH, minor is WHWWHWW
@@ -63,14 +198,25 @@ def midi_to_frequency(midi_number):
     return 440.0 * (2.0 ** ((midi_number - 69.0) / 12.0))
 
 
+@lru_cache(maxsize=256)
 def find_note(frequency):
     if frequency == 0: return "???"
     midi = 69 + 12 * np.log2(frequency / 440.0)
     midi = int(round(midi))
-    note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
     octave = (midi // 12) - 1
     note_index = midi % 12
-    return f"{note_names[note_index]}{octave}"
+    return f"{NOTE_NAMES[note_index]}{octave}"
+
+
+def chord_label(quality, root, third, fifth):
+    """the text the gui shows for a chord, made once when the chord goes into a timeline"""
+    return f"{find_note(root)} {quality} ({find_note(root)},{find_note(third)},{find_note(fifth)})"
+
+WAVE_CHOICES = [
+    "Random (All)", "Sine", "Square", "Triangle", "Saw",
+    "Sine + Triangle", "Square + Saw", "White Noise",
+]
+
 
 def get_tone(wave_choice):
     if wave_choice == "Random (All)":
@@ -93,73 +239,168 @@ def get_tone(wave_choice):
         pool = [white_noise]
     return pool
 
-def chord_player(n, bpm, root_index, scale_type, wave_choice, downsample_rate):
-    chunk_parts = []
-    chord_data = []
+def chord_stream(bpm, root_index, scale_type, wave_choice, downsample_rate=None):
+    """
+    endless version of chord_player, yields (chord_wave, chord_info) one chord at a time
+    so callers only ever render what they need next
+    """
+    rng = np.random.default_rng()
     pool = get_tone(wave_choice)
     scale = get_scale(root_index, scale_type)
-    playable_indices = np.arange(0, len(scale) - 5)
     duration = 60 / bpm
 
-    generation_rate = downsample_rate if downsample_rate else PLAYBACK_RATE
-    print(f"Generating {n} chords ({wave_choice}) in {scale_type} at {bpm} BPM...")
-
-    for i in range(n):
-        root_index_scale = np.random.choice(playable_indices)
-        third_index_scale = root_index_scale + 2
-        fifth_index_scale = root_index_scale + 4
-
-        root_midi = scale[root_index_scale]
-        third_midi = scale[third_index_scale]
-        fifth_midi = scale[fifth_index_scale]
-
-        distance_third = third_midi - root_midi
-        distance_fifth = fifth_midi - root_midi
-
-        quality = "???"
-        if distance_third == 4 and distance_fifth == 7:
-            quality = "Maj"
-        elif distance_third == 3 and distance_fifth == 7:
-            quality = "Min"
-        elif distance_third == 3 and distance_fifth == 6:
-            quality = "Dim"
-        elif distance_third == 4 and distance_fifth == 8:
-            quality = "Aug"
-
-        root_frequency = midi_to_frequency(root_midi)
-        third_frequency = midi_to_frequency(third_midi)
-        fifth_frequency = midi_to_frequency(fifth_midi)
-
-        root_wave = random.choice(pool)(root_frequency, duration, sample_rate=generation_rate)
-        third_wave = random.choice(pool)(third_frequency, duration, sample_rate=generation_rate)
-        fifth_wave = random.choice(pool)(fifth_frequency, duration, sample_rate=generation_rate)
-
-        chord_data.append({
+    while True:
+        _, midi = pick_chords(scale, 1, rng)
+        quality = chord_qualities(midi[:, 1] - midi[:, 0], midi[:, 2] - midi[:, 0])[0]
+        root_frequency, third_frequency, fifth_frequency = midi_to_frequency(midi[0])
+
+        chord_info = {
             "root": root_frequency,
             "third": third_frequency,
             "fifth": fifth_frequency,
             "quality": quality,
             "note_name": find_note(root_frequency)
-        })
+        }
+
+        yield render_chords(midi, pool, duration, downsample_rate, rng), chord_info
+
+
+RENDER_BATCH_SAMPLES = 2 ** 22  # how many voice samples get rendered in one go before moving on
+
+TONE_SHAPES = {
+    sine_tone: "sine",
+    square_tone: "square",
+    triangle_tone: "triangle",
+    saw_tone: "saw",
+}
+
+
+def chord_qualities(distance_third, distance_fifth):
+    """Maj/Min/Dim/Aug (or ???) for whole arrays of chords at once"""
+    qualities = np.full(len(distance_third), "???", dtype=object)
+    qualities[(distance_third == 4) & (distance_fifth == 7)] = "Maj"
+    qualities[(distance_third == 3) & (distance_fifth == 7)] = "Min"
+    qualities[(distance_third == 3) & (distance_fifth == 6)] = "Dim"
+    qualities[(distance_third == 4) & (distance_fifth == 8)] = "Aug"
+    return qualities
+
+
+def pick_chords(scale, n, rng):
+    """n random triads off the scale, returns (root scale degrees, (n, 3) midi notes root/third/fifth)"""
+    root_scale_indices = rng.choice(np.arange(0, len(scale) - 5), size=n)
+    return root_scale_indices, scale[root_scale_indices[:, None] + np.array([0, 2, 4])]
+
 
-        chord = (root_wave + third_wave + fifth_wave) * 0.3
+def chord_envelope(chord_length):
+    """voice level with the click guard fades at both ends, short chords get shorter fades"""
+    fade_len = min(100, chord_length // 2)
+    envelope = np.full(chord_length, 0.3 * 0.3, dtype=SAMPLE_DTYPE)  # voice amplitude * chord mix
+    if fade_len:
+        envelope[:fade_len] *= np.linspace(0, 1, fade_len, dtype=SAMPLE_DTYPE)
+        envelope[chord_length - fade_len:] *= np.linspace(1, 0, fade_len, dtype=SAMPLE_DTYPE)
+    return envelope
 
-        fade_len = min(100, len(chord) // 2)
-        chord[:fade_len] *= np.linspace(0, 1, fade_len)
-        chord[-fade_len:] *= np.linspace(1, 0, fade_len)
 
-        if downsample_rate:
-            # each sample gotta be repeating a (sample/ downsample) amount of times
-            target_length = int(duration * PLAYBACK_RATE)
-            step = PLAYBACK_RATE / downsample_rate
-            indexes = np.arange(target_length) / step
-            indexes = np.clip(indexes, 0, len(chord) - 1) # to prevent out of bound stuff
-            chord = chord[indexes.astype(int)]
+def render_chords(midi, pool, duration, downsample_rate=None, rng=None):
+    """
+    renders the chords in midi ((n, 3) notes) back to back. a voice only depends on its
+    note and oscillator so every (note, oscillator) pair gets rendered once, with the fade
+    and downsampling already baked in, and then each chord is just three rows gathered and
+    added up. white noise is the exception since it has to be different every chord.
+    rng is a numpy Generator, a fresh unseeded one if not given
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    n = len(midi)
+    generation_rate = downsample_rate if downsample_rate else PLAYBACK_RATE
+    chord_length = max(1, int(generation_rate * duration))
+    output_length = int(duration * PLAYBACK_RATE) if downsample_rate else chord_length
+
+    # every voice picks its own oscillator from the pool like random.choice did
+    voice_waves = rng.integers(len(pool), size=(n, 3))
+    shapes = [TONE_SHAPES.get(tone) for tone in pool]
+    is_noise = np.array([shape is None for shape in shapes])[voice_waves]
+
+    envelope = chord_envelope(chord_length)
+    if downsample_rate:
+        # each sample gotta be repeating a (sample/ downsample) amount of times
+        step = PLAYBACK_RATE / downsample_rate
+        hold_indexes = np.clip(np.arange(output_length) / step, 0, chord_length - 1).astype(int)
+    else:
+        hold_indexes = slice(None)
+
+    # render each distinct voice once, rows for noise voices stay silent
+    voice_keys = midi * len(pool) + voice_waves
+    unique_keys, voice_rows = np.unique(voice_keys, return_inverse=True)
+    voice_rows = voice_rows.reshape(n, 3)
+    table_size = _table_size(generation_rate)
+    unique_voices = np.zeros((len(unique_keys), chord_length), dtype=SAMPLE_DTYPE)
+    for row, key in enumerate(unique_keys):
+        shape = shapes[key % len(pool)]
+        if shape is not None:
+            table = _wavetable(shape, generation_rate)
+            frequency = midi_to_frequency(key // len(pool))
+            phase = _table_phase(np.arange(chord_length), frequency * table_size / generation_rate, table_size)
+            unique_voices[row] = _table_lookup(table, phase)
+    unique_voices = (unique_voices * envelope)[:, hold_indexes]
+
+    full_song = np.empty(n * output_length, dtype=SAMPLE_DTYPE)
+    batch = max(1, RENDER_BATCH_SAMPLES // output_length)
+
+    for first in range(0, n, batch):
+        last = min(n, first + batch)
+        chords = full_song[first * output_length:last * output_length].reshape(last - first, output_length)
+
+        np.take(unique_voices, voice_rows[first:last, 0], axis=0, out=chords)
+        chords += unique_voices[voice_rows[first:last, 1]]
+        chords += unique_voices[voice_rows[first:last, 2]]
+
+        noise_voices = is_noise[first:last]
+        if noise_voices.any():
+            noise = np.zeros((last - first, chord_length), dtype=SAMPLE_DTYPE)
+            for voice in range(3):
+                hits = noise_voices[:, voice]
+                if hits.all():
+                    noise += rng.uniform(-1, 1, noise.shape)
+                elif hits.any():
+                    noise[hits] += rng.uniform(-1, 1, (int(hits.sum()), chord_length))
+            noise *= envelope
+            chords += noise[:, hold_indexes]
+
+    return full_song
+
+
+def chord_player(n, bpm, root_index, scale_type, wave_choice, downsample_rate, rng=None):
+    """
+    renders n random chords in one go (see render_chords). pass a seeded numpy Generator
+    as rng to get the same progression every time
+
+    returns (audio, ChordTimeline)
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+
+    pool = get_tone(wave_choice)
+    scale = get_scale(root_index, scale_type)
+    duration = 60 / bpm
+
+    root_scale_indices, midi = pick_chords(scale, n, rng)
+    frequencies = midi_to_frequency(midi)
+    qualities = chord_qualities(midi[:, 1] - midi[:, 0], midi[:, 2] - midi[:, 0])
 
-        chunk_parts.append(chord)
+    full_song = render_chords(midi, pool, duration, downsample_rate, rng)
+    output_length = len(full_song) // n
 
-    full_song = np.concatenate(chunk_parts)
-    return full_song, chord_data
+    # a label only depends on which scale degree the chord starts on
+    degrees, first_chord = np.unique(root_scale_indices, return_index=True)
+    degree_labels = {degree: chord_label(qualities[k], *frequencies[k]) for degree, k in zip(degrees, first_chord)}
+    timeline = ChordTimeline.from_arrays(
+        np.arange(n) * output_length,
+        frequencies,
+        qualities,
+        [degree_labels[degree] for degree in root_scale_indices],
+        end=n * output_length,
+    )
+
+    return full_song, timeline
 
 
 """
@@ -169,37 +410,55 @@ then from there just make all values within that step that value causing blockin
 it is gonna have some aliasing but that is intendd
 """
 
-def apply_downsample(buffer, target_sample_rate, original_rate=44100):
+OFFLINE_CHUNK = 1 << 16  # samples per pass for the offline effects, their scratch stays at a few of these
+
+
+def apply_downsample(buffer, target_sample_rate, original_rate=44100, chunk_size=OFFLINE_CHUNK):
     if not target_sample_rate or target_sample_rate >= original_rate:
         return buffer
     step_size = original_rate / target_sample_rate
-    sample_indexes = np.arange(len(buffer))
-    indexes = (np.floor(sample_indexes / step_size) * step_size).astype(int)
-    indexes = np.clip(indexes, 0, len(buffer) - 1)
-    return buffer[indexes]
+    output = np.empty_like(buffer)
+    for start in range(0, len(buffer), chunk_size):
+        sample_indexes = np.arange(start, min(start + chunk_size, len(buffer)))
+        indexes = (np.floor(sample_indexes / step_size) * step_size).astype(int)
+        indexes = np.clip(indexes, 0, len(buffer) - 1)
+        output[start:start + len(indexes)] = buffer[indexes]
+    return output
 
 
-def apply_flanger(audio_data, sample_rate=44100, lfo_rate=0.5, depth=0.004):
+def apply_flanger(audio_data, sample_rate=44100, lfo_rate=0.5, depth=0.004, chunk_size=OFFLINE_CHUNK):
     """
     flanger is just the combination of a dry signal with a wet signal that has a delay that is modulated with an LFO
+
+    goes through the buffer a chunk at a time so the temporaries never get bigger than a chunk.
+    the lfo runs off the absolute sample index and the delay just reads back into the input,
+    so every chunk comes out exactly like it would in one big pass
     """
-    t = np.arange(len(audio_data)) / sample_rate
-    lfo = (np.sin(2 * np.pi * lfo_rate * t) + 1) / 2 # our modulator
-    # calc delay at every point of the audio
-    max_delay_samples = depth * sample_rate
-    delay_in_samples = lfo * max_delay_samples
-
-    indices = np.arange(len(audio_data)) - delay_in_samples # locate delay in audio
-    valid = indices >= 0
-
-    # linear interpolation on delay
-    i = np.floor(indices).astype(int)
-    j = i + 1
-    k = indices - i
-    i_safe = np.clip(i, 0, len(audio_data) - 1)
-    j_safe = np.clip(j, 0, len(audio_data) - 1)
-
-    delayed_signal = np.zeros_like(audio_data)
-    delayed_signal[valid] = (audio_data[i_safe[valid]] * (1 - k[valid]) +
-                             audio_data[j_safe[valid]] * k[valid])
-    return (audio_data + delayed_signal) * 0.5 #  could change 0.5 into a variable with a wet/dry slider
\ No newline at end of file
+    output = np.empty_like(audio_data)
+    dtype = audio_data.dtype.type
+    for start in range(0, len(audio_data), chunk_size):
+        sample_indexes = np.arange(start, min(start + chunk_size, len(audio_data)))
+        t = sample_indexes / sample_rate
+        lfo = (np.sin(2 * np.pi * lfo_rate * t) + 1) / 2 # our modulator
+        # calc delay at every point of the audio
+        max_delay_samples = depth * sample_rate
+        delay_in_samples = lfo * max_delay_samples
+
+        indices = sample_indexes - delay_in_samples # locate delay in audio
+        valid = indices >= 0
+
+        # linear interpolation on delay, the weights stay float64 and the tap gets rounded
+        # once on the way into delayed_signal, same as the original whole-buffer pass
+        i = np.floor(indices).astype(int)
+        j = i + 1
+        k = indices - i
+        i_safe = np.clip(i, 0, len(audio_data) - 1)
+        j_safe = np.clip(j, 0, len(audio_data) - 1)
+
+        delayed_signal = np.zeros(len(sample_indexes), dtype=audio_data.dtype)
+        delayed_signal[valid] = (audio_data[i_safe[valid]] * (1 - k[valid]) +
+                                 audio_data[j_safe[valid]] * k[valid])
+        chunk = output[start:start + len(sample_indexes)]
+        np.add(audio_data[start:start + len(sample_indexes)], delayed_signal, out=chunk)
+        chunk *= dtype(0.5) #  could change 0.5 into a variable with a wet/dry slider
+    return output
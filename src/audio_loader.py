@@ -1,29 +1,200 @@
-import librosa
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
 from pathlib import Path
 import numpy as np
+import platformdirs
+import soundfile as sf
+
+from audio_engine import SAMPLE_DTYPE
+from timeline import ChordTimeline
 
 
 """
 This file just loads a wav file for now
 
+decoding + resampling through librosa is slow so the result gets cached twice:
+on disk as a .npy keyed by a hash of the file contents (opened memory mapped), and
+in memory keyed by path/mtime/size so we dont even rehash files we just loaded
+
+the disk side is capped at DECODED_CACHE_BYTES (SATIN_DECODED_CACHE_MB, 2 GB by default),
+every write throws out the files used longest ago until it fits again. deleting the
+decoded folder by hand is always safe too, anything missing just gets decoded again
 """
 
+CACHE_DIR = Path(os.environ.get("SATIN_CACHE_DIR") or platformdirs.user_cache_dir("satin-playing-grounds"))
+DECODED_CACHE_DIR = CACHE_DIR / "decoded"
+DECODED_CACHE_BYTES = int(float(os.environ.get("SATIN_DECODED_CACHE_MB") or 2048) * 1024 * 1024)
+MEMORY_CACHE_SIZE = 8
+HASH_CACHE_SIZE = 1024  # digests are tiny, this just stops a long session piling them up
+
+_memory_cache = OrderedDict()
+_memory_lock = threading.Lock()
+_hash_cache = OrderedDict()
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """hash of the file contents, so renamed/copied files still hit the cache"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_file_hash(path):
+    """file_hash, but remembered per path/mtime/size so the same file doesn't get read twice"""
+    path = Path(path).resolve()
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    with _memory_lock:
+        digest = _hash_cache.get(key)
+        if digest is not None:
+            _hash_cache.move_to_end(key)
+            return digest
+    digest = file_hash(path)
+    _remember(_hash_cache, HASH_CACHE_SIZE, key, digest)
+    return digest
+
+
+def atomic_write(path, write):
+    """
+    write(f) into a temp file next to path, which only replaces path once it's complete.
+    every call gets its own temp file, so the render worker, peak builds and the analysis
+    thread can all write the same key at once and whoever finishes last just wins
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    f = tempfile.NamedTemporaryFile(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False)
+    try:
+        with f:
+            write(f)
+        os.replace(f.name, path)
+    except BaseException:
+        try:
+            os.unlink(f.name)
+        except OSError:
+            pass
+        raise
+
+
+def save_cached_array(cache_path, array):
+    """writes array as a .npy and opens it back memory mapped, then trims the cache to fit"""
+    atomic_write(cache_path, lambda f: np.save(f, array))
+    array = np.load(cache_path, mmap_mode="r")
+    trim_decoded_cache(keep=cache_path)
+    return array
+
+
+def load_cached_array(cache_path):
+    """the .npy at cache_path memory mapped, or None if it isn't cached (or just got trimmed)"""
+    try:
+        array = np.load(cache_path, mmap_mode="r")
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(cache_path)  # mtime is when it was last used, that's what trimming goes by
+    except OSError:
+        pass
+    return array
+
+
+def trim_decoded_cache(max_bytes=None, keep=None):
+    """deletes the least recently used files in DECODED_CACHE_DIR until they fit in max_bytes"""
+    max_bytes = DECODED_CACHE_BYTES if max_bytes is None else max_bytes
+    try:
+        entries = list(os.scandir(DECODED_CACHE_DIR))
+    except OSError:
+        return
+    files = []
+    for entry in entries:
+        if entry.name.endswith(".tmp"):
+            continue  # someone else's write that hasn't landed yet
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        if entry.is_file():
+            files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    keep = os.path.abspath(keep) if keep is not None else None
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(path) == keep:
+            continue
+        try:
+            os.unlink(path)
+        except OSError:
+            continue  # windows won't delete a file something still has mapped, next trim gets it
+        total -= size
+
+
+def _remember(cache, size, key, value):
+    """puts value in one of the lru caches, dropping whatever was used longest ago"""
+    with _memory_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+
+def decode(path, sample_rate=44100):
+    """
+    mono float32 buffer at sample_rate. soundfile is enough when the file already has the
+    right rate, librosa (and everything it drags in) only gets imported when we resample
+    """
+    try:
+        info = sf.info(str(path))
+    except RuntimeError:
+        info = None  # not something libsndfile reads, let librosa try
+
+    if info is not None and info.samplerate == sample_rate:
+        data = sf.read(str(path), dtype=SAMPLE_DTYPE, always_2d=True)[0]
+        return data.mean(axis=1, dtype=SAMPLE_DTYPE) if data.shape[1] > 1 else data[:, 0]
+
+    import librosa
+    waveform, _ = librosa.load(path, sr=sample_rate, mono=True, dtype=SAMPLE_DTYPE)
+    return waveform
+
+
+def load_waveform(path, sample_rate=44100):
+    """decoded mono float buffer at sample_rate, from the cache when we've seen the file before"""
+    path = Path(path).resolve()
+    stat = path.stat()
+    memory_key = (str(path), stat.st_mtime_ns, stat.st_size, sample_rate)
+
+    with _memory_lock:
+        waveform = _memory_cache.get(memory_key)
+        if waveform is not None:
+            _memory_cache.move_to_end(memory_key)
+            return waveform
+
+    cache_path = DECODED_CACHE_DIR / f"{cached_file_hash(path)}_{sample_rate}.npy"
+    waveform = load_cached_array(cache_path)
+    if waveform is None:
+        waveform = decode(path, sample_rate)
+        try:
+            waveform = save_cached_array(cache_path, waveform)
+        except OSError as e:
+            print(f"Could not cache {path.name}: {e}")
+
+    _remember(_memory_cache, MEMORY_CACHE_SIZE, memory_key, waveform)
+    return waveform
+
+
 def load_wav_file(filename):
     path = Path(filename)
 
     if not path.exists():
         print(f"Could not find {path}")
-        return np.zeros(1024), []
-
-    waveform, sample_rate = librosa.load(path, sr=44100, mono=True)
+        return np.zeros(1024, dtype=SAMPLE_DTYPE), ChordTimeline.single("???", 1024)
 
-    # just fake chord to appease the gui for now
-    fake_chord_data = [{
-        "root": 0,
-        "third": 0,
-        "fifth": 0,
-        "quality": "File",
-        "note_name": path.stem
-    }]
+    waveform = load_waveform(path, sample_rate=44100)
 
-    return waveform, fake_chord_data
\ No newline at end of file
+    # no chords in a file (yet), one event so the gui still has something to show
+    return waveform, ChordTimeline.single(f"{path.stem} File", len(waveform))
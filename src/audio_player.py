@@ -1,34 +1,48 @@
 import numpy as np
-import sounddevice as sd
 from dataclasses import dataclass
 
+from audio_backends import SoundDeviceBackend
+from audio_effects import EffectChain
+from audio_stats import CallbackStats
+from audio_engine import SAMPLE_DTYPE, Interpolator
+
 """
 This is meant to play back the audio from the engine/loader
+
+the callback runs on the audio thread, so everything it needs gets allocated up front in
+_allocate_scratch and it works with out= forms from there. the scope reads current_chunk
+out of a small ring of preallocated rows that the callback rotates through.
+where the blocks go is up to the backend (see audio_backends), the sound card by default
 """
 
+SCOPE_SLOTS = 4
+
 
 @dataclass(frozen=True)
 class _BufferState:
     buffer: np.ndarray
     length: int
+    stream: object = None
 
 
 class AudioPlayer:
-    def __init__(self, sample_rate=44100, blocksize=1024):
+    def __init__(self, sample_rate=44100, blocksize=1024, backend=None):
         self.default_rate = sample_rate
         self.sample_rate = sample_rate
         self.blocksize = blocksize
         self.volume = 0.5
 
-        self._state = _BufferState(np.zeros(blocksize), 0)
+        self._state = _BufferState(np.zeros(blocksize, dtype=SAMPLE_DTYPE), 0)
 
         self.cursor = 0.0
         self.playback_rate = 1.0
 
         self.is_playing = False
         self.looping = False
-        self.current_chunk = np.zeros(blocksize)
+        self.effects = EffectChain(sample_rate, blocksize)
+        self.stats = CallbackStats()
 
+        self.backend = backend if backend is not None else SoundDeviceBackend()
         self._start_stream()
 
     @property
@@ -39,86 +53,160 @@ class AudioPlayer:
     def buffer_length(self):
         return self._state.length
 
+    @property
+    def is_streaming(self):
+        return self._state.stream is not None
+
+    @property
+    def current_chunk(self):
+        return self._scope[self._scope_slot]
+
+    def _allocate_scratch(self, frames):
+        self._steps = np.arange(frames, dtype=np.float64)
+        self._positions = np.empty(frames)
+        self._lerp = Interpolator(frames)
+        self._scope = np.zeros((SCOPE_SLOTS, frames), dtype=SAMPLE_DTYPE)
+        self._scope_slot = 0
+        self.effects.prepare(frames)
+
     def _start_stream(self):
+        self._allocate_scratch(self.blocksize)
         try:
-            self.stream = sd.OutputStream(
-                channels=1,
-                blocksize=self.blocksize,
-                samplerate=self.sample_rate,
-                callback=self._audio_callback
-            )
-            self.stream.start()
+            self.backend.open(self._audio_callback, self.sample_rate, self.blocksize)
+            self.backend.start()
         except Exception as e:
             print(f"Error starting stream: {e}")
 
+    def close(self):
+        self._stop_stream_source()
+        self.backend.close()
+
     def update_rate(self, speed_ratio):
         self.playback_rate = speed_ratio
 
+    def set_pitch(self, ratio):
+        """pitch on top of the speed, 1.0 leaves it tied to the playback rate like a record"""
+        self.effects.pitch.set_ratio(ratio)
+
     def set_volume(self, value):
         self.volume = np.clip(value, 0.0, 1.0)
 
-    def play(self, audio_data):
+    def set_downsample(self, target_rate):
+        self.effects.downsampler.set_rate(target_rate)
+
+    def set_flanger(self, enabled, lfo_rate=None, depth=None):
+        self.effects.flanger.set_params(lfo_rate, depth)
+        self.effects.flanger.enabled = enabled
 
+    def play(self, audio_data):
+        audio_data = np.asarray(audio_data, dtype=SAMPLE_DTYPE)
+        self._stop_stream_source()
         self._state = _BufferState(audio_data, len(audio_data))
         self.cursor = 0.0
+        self.effects.reset()
         self.is_playing = True
 
-    def update_buffer(self, audio_data):
-        new_state = _BufferState(audio_data, len(audio_data))
-        if self.cursor >= new_state.length:
-            self.cursor = 0.0
-        self._state = new_state
+    def play_stream(self, stream):
+        """plays a streaming source (see audio_stream) that gets filled just ahead of the cursor"""
+        self._stop_stream_source()
+        stream.start()
+        self._state = _BufferState(np.zeros(self.blocksize, dtype=SAMPLE_DTYPE), stream.length or 0, stream)
+        self.cursor = 0.0
+        self.effects.reset()
+        self.is_playing = True
+
+    def _stop_stream_source(self):
+        if self._state.stream is not None:
+            self._state.stream.stop()
+
+    def render_offline(self, seconds=None):
+        """
+        pumps a NullBackend/WavFileBackend until playback stops, or for seconds if given
+        (looping and endless streams never stop on their own). returns the frames rendered
+        """
+        if seconds is not None:
+            return self.backend.pump(int(seconds * self.sample_rate))
+        if self.looping or (self.is_streaming and self._state.stream.length is None):
+            raise ValueError("Looping / endless playback needs a length to render")
+        frames = 0
+        while self.is_playing:
+            # the last block stops where the audio does, so a file render is as long as the source
+            remaining = int(np.ceil((self.buffer_length - self.cursor) / self.playback_rate))
+            if remaining <= 0:
+                self.is_playing = False
+                break
+            frames += self.backend.pump(min(self.blocksize, remaining))
+        return frames
 
     def get_state(self):
         return self.current_chunk, self.cursor, self.buffer_length
 
-    def _audio_callback(self, output_data, frames, time, status):
-        if status: print(status)
+    def get_stats(self):
+        """callback timing / xrun numbers, see audio_stats.CallbackStats.snapshot"""
+        return self.stats.snapshot()
 
-        state = self._state  # sinfular snapsjot
-        buffer, buffer_length = state.buffer, state.length
+    def reset_stats(self):
+        self.stats.reset()
 
-        if not self.is_playing or (self.cursor >= buffer_length and not self.looping):
-            output_data.fill(0)
-            self.current_chunk = np.zeros(frames)
-            self.is_playing = False
-            return
+    def _audio_callback(self, output_data, frames, time, status):
+        started = self.stats.now()
 
-        positions = self.cursor + np.arange(frames) * self.playback_rate
+        state = self._state  # sinfular snapsjot
+        if frames > len(self._steps):
+            self._allocate_scratch(frames)  # only if the device hands us a bigger block than we asked for
+
+        # fill the next scope row, then publish it in one go
+        slot = (self._scope_slot + 1) % SCOPE_SLOTS
+        chunk = self._scope[slot]
+        count = self._fill_chunk(state, chunk, frames)
+        chunk[count:].fill(0)
+
+        output_data[:, 0] = chunk[:frames]
+        self._scope_slot = slot
+        self.stats.record(started, frames, self.sample_rate, status)
+
+    def _fill_chunk(self, state, chunk, frames):
+        """writes the next block into chunk, returns how many samples are real audio"""
+        length = state.length
+        stream = state.stream
+        endless = stream is not None and stream.length is None
+
+        if not self.is_playing or (not endless and (length == 0 or (self.cursor >= length and not self.looping))):
+            if not endless:
+                self.is_playing = False
+            return 0
+
+        positions = self._positions[:frames]
+        np.multiply(self._steps[:frames], self.playback_rate, out=positions)
+        positions += self.cursor
 
         # wrapping :)
-        if self.looping:
-            positions = positions % buffer_length
+        if endless:
+            count = frames
+        elif self.looping:
+            np.remainder(positions, length, out=positions)
+            count = frames
         else:
-            valid_mask = positions < (buffer_length - 1)
-            positions = positions[valid_mask]
+            # positions only go up so everything past the end is a tail, the last sample
+            # holds for positions between it and the end
+            count = int(np.searchsorted(positions, length))
 
-        if len(positions) == 0:
-            output_data.fill(0)
-            self.current_chunk = np.zeros(frames)
+        if count == 0:
             self.is_playing = False
-            return
-
-        i = positions.astype(int)
-        j = i + 1
+            return 0
 
-        if self.looping:
-            j = j % buffer_length
+        out = chunk[:count]
+        if stream is not None:
+            stream.read(positions[:count], out)
         else:
-            j = np.clip(j, 0, buffer_length - 1)
-
-        fractions = positions - i
-
-        chunk = (buffer[i] * (1.0 - fractions) +
-                 buffer[j] * fractions) * self.volume
-
-        output_data.fill(0)
-        output_data[:len(chunk), 0] = chunk
-
-        self.current_chunk = np.zeros(frames)
-        self.current_chunk[:len(chunk)] = chunk
+            self._lerp.lerp_into(state.buffer, positions[:count], out, length, wrap=self.looping)
 
+        self.effects.process(out)
+        out *= SAMPLE_DTYPE(self.volume)
 
         self.cursor += frames * self.playback_rate
-        if self.looping:
-            self.cursor = self.cursor % buffer_length
\ No newline at end of file
+        if self.looping and not endless:
+            self.cursor = self.cursor % length
+        if stream is not None:
+            stream.advance(self.cursor, self.looping)
+        return count
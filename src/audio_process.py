@@ -0,0 +1,323 @@
+import atexit
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from audio_engine import SAMPLE_DTYPE
+from audio_player import SCOPE_SLOTS, AudioPlayer
+from audio_stats import CallbackStats
+
+"""
+runs the AudioPlayer (callback, effects, streams) in its own process so the gui's GIL,
+garbage collection and renders can't make it miss a block.
+
+RemotePlayer looks like an AudioPlayer to the gui and controller. commands go over a pipe,
+and nothing that's big goes through it: audio buffers get copied once into a shared memory
+block which the audio process plays straight out of, and the scope rows plus cursor/length
+live in two more shared blocks the callback writes every time it runs. the callback
+timing stats get copied into the status block too, so the dsp overlay never has to ask
+
+streams can't be pickled (threads, open files), so the audio process builds its own copy
+from stream.init_args and sends the chord timeline events back as they get rendered
+"""
+
+SCOPE_CAPACITY = 4  # scope rows hold this many times the asked for blocksize
+POLL_SECONDS = 0.01  # how long the audio process waits for a command, also how often stats get published
+
+# slots in the status block, CallbackStats.pack() fills everything from STATS on
+CURSOR, LENGTH, PLAYING, STREAMING, SLOT, FRAMES, APPLIED, STATS = range(8)
+STATUS_SIZE = STATS + CallbackStats().packed_size()
+
+
+def _attach(name, shape, dtype):
+    block = shared_memory.SharedMemory(name=name)
+    return block, np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+
+class _SharedPlayer(AudioPlayer):
+    """AudioPlayer with its scope ring and state mirrored into shared memory"""
+
+    def __init__(self, status, scope, sample_rate, blocksize, backend=None):
+        self._status = status
+        self._shared_scope = scope
+        self.blocks_done = 0
+        super().__init__(sample_rate, blocksize, backend)
+
+    def _allocate_scratch(self, frames):
+        super()._allocate_scratch(frames)
+        # a device block bigger than the shared rows keeps a private scope, the gui just sees it go still
+        if frames <= self._shared_scope.shape[1]:
+            self._scope = self._shared_scope[:, :frames]
+            self._status[FRAMES] = frames
+
+    def publish(self):
+        status = self._status
+        status[CURSOR] = self.cursor
+        status[LENGTH] = self.buffer_length
+        status[PLAYING] = self.is_playing
+        status[STREAMING] = self.is_streaming
+        status[SLOT] = self._scope_slot
+
+    def publish_stats(self):
+        # from the command loop, not the callback, it's a couple of dozen numbers
+        self.stats.pack(self._status[STATS:])
+
+    def _audio_callback(self, output_data, frames, time, status):
+        super()._audio_callback(output_data, frames, time, status)
+        self.publish()
+        self.blocks_done += 1
+
+
+def _audio_main(conn, status_name, scope_name, sample_rate, blocksize, backend):
+    status_block, status = _attach(status_name, STATUS_SIZE, np.float64)
+    scope_block, scope = _attach(scope_name, (SCOPE_SLOTS, SCOPE_CAPACITY * blocksize), SAMPLE_DTYPE)
+    player = _SharedPlayer(status, scope, sample_rate, blocksize, backend)
+    player.publish()
+
+    buffers = {}  # shared block name -> (block, array) for the buffer playing and ones being let go
+    current = None
+    retired = []
+    remote_stream = None
+    events_sent = 0
+
+    while True:
+        if conn.poll(POLL_SECONDS):
+            message = conn.recv()
+            seq, command = message[0], message[1]
+            if command == "quit":
+                break
+
+            if command == "play":
+                name, length = message[2], message[3]
+                block, array = _attach(name, length, SAMPLE_DTYPE)
+                buffers[name] = (block, array)
+                player.play(array)
+                if current is not None:
+                    retired.append((current, player.blocks_done))
+                current = name
+            elif command == "play_stream":
+                stream_type, init_args = message[2], message[3]
+                remote_stream = stream_type(*init_args)
+                events_sent = 0
+                player.play_stream(remote_stream)
+                if current is not None:
+                    retired.append((current, player.blocks_done))
+                current = None
+            elif command == "set":
+                setattr(player, message[2], message[3])
+            elif command == "call":
+                getattr(player, message[2])(*message[3], **message[4])
+
+            player.publish()
+            status[APPLIED] = seq
+        player.publish_stats()
+
+        # the callback grabs its state once per block, so wait for one more block before
+        # letting a swapped out buffer go (or none at all if there's no device running)
+        for name, retired_at in list(retired):
+            if player.blocks_done == retired_at and player.backend.active:
+                continue
+            block, array = buffers[name]
+            buffers[name] = (block, None)
+            del array
+            try:
+                block.close()
+            except BufferError:
+                continue  # something still has a view on it, try again next time round
+            del buffers[name]
+            retired.remove((name, retired_at))
+            conn.send(("released", name))
+
+        if remote_stream is not None and player.is_streaming and getattr(remote_stream, "timeline", None) is not None:
+            timeline = remote_stream.timeline
+            total = timeline.first_number + len(timeline)
+            if total > events_sent:
+                conn.send(("events",) + timeline.events_since(events_sent))
+                events_sent = total
+
+    player.close()
+    for block, _ in buffers.values():
+        block.close()
+    status_block.close()
+    scope_block.close()
+
+
+class RemotePlayer:
+    """same interface as AudioPlayer, with the real one running in an audio process"""
+
+    def __init__(self, sample_rate=44100, blocksize=1024, backend=None):
+        """backend gets pickled over to the audio process and opened there, None is the sound card"""
+        self.default_rate = sample_rate
+        self.sample_rate = sample_rate
+        self.blocksize = blocksize
+        self.volume = 0.5
+        self.playback_rate = 1.0
+        self._looping = False
+
+        self._status_block = shared_memory.SharedMemory(create=True, size=STATUS_SIZE * 8)
+        self._status = np.ndarray(STATUS_SIZE, dtype=np.float64, buffer=self._status_block.buf)
+        self._status.fill(0)
+        self._status[FRAMES] = blocksize
+        self._scope_block = shared_memory.SharedMemory(
+            create=True, size=SCOPE_SLOTS * SCOPE_CAPACITY * blocksize * np.dtype(SAMPLE_DTYPE).itemsize)
+        self._scope = np.ndarray((SCOPE_SLOTS, SCOPE_CAPACITY * blocksize), dtype=SAMPLE_DTYPE,
+                                 buffer=self._scope_block.buf)
+        self._scope.fill(0)
+
+        self._buffers = {}  # shared block name -> (block, array) the audio process may still be reading
+        self._stream = None  # gui side copy of a stream, only its timeline gets used
+        self._sent = 0
+        self._expected = {}  # what the state will be once the audio process catches up
+
+        # spawn, forking a process with qt and audio threads in it doesn't go well
+        context = multiprocessing.get_context("spawn")
+        self._conn, child_conn = context.Pipe()
+        self._process = context.Process(
+            target=_audio_main, daemon=True,
+            args=(child_conn, self._status_block.name, self._scope_block.name,
+                  sample_rate, blocksize, backend),
+        )
+        self._process.start()
+        child_conn.close()
+        atexit.register(self.close)
+
+    def _send(self, command, *args, expected=None):
+        self._sent += 1
+        if self._status[APPLIED] >= self._sent - 1:
+            self._expected = {}
+        self._expected.update(expected or {})
+        try:
+            self._conn.send((self._sent, command) + args)
+        except (BrokenPipeError, OSError) as e:
+            print(f"Audio process is not running: {e}")
+
+    def _read(self, index):
+        if index in self._expected:
+            if self._status[APPLIED] < self._sent:
+                return self._expected[index]
+            self._expected = {}
+        return self._status[index]
+
+    def _handle_messages(self):
+        """deals with everything the audio process sent, never waits"""
+        while True:
+            try:
+                if not self._conn.poll():
+                    return
+                message = self._conn.recv()
+            except (EOFError, OSError):
+                return  # the audio process is gone, the status block just stops moving
+            if message[0] == "released":
+                block, array = self._buffers.pop(message[1])
+                del array
+                block.close()
+                block.unlink()
+            elif message[0] == "events" and self._stream is not None:
+                self._stream.timeline.extend(*message[1:])
+
+    @property
+    def buffer_length(self):
+        return int(self._read(LENGTH))
+
+    @property
+    def is_streaming(self):
+        return bool(self._read(STREAMING))
+
+    @property
+    def cursor(self):
+        return float(self._read(CURSOR))
+
+    @property
+    def is_playing(self):
+        return bool(self._read(PLAYING))
+
+    @is_playing.setter
+    def is_playing(self, value):
+        self._send("set", "is_playing", bool(value), expected={PLAYING: bool(value)})
+
+    @property
+    def looping(self):
+        return self._looping
+
+    @looping.setter
+    def looping(self, value):
+        self._looping = value
+        self._send("set", "looping", value)
+
+    @property
+    def current_chunk(self):
+        return self._scope[int(self._status[SLOT]), :int(self._status[FRAMES])]
+
+    def _share(self, audio_data):
+        audio_data = np.asarray(audio_data, dtype=SAMPLE_DTYPE)
+        block = shared_memory.SharedMemory(create=True, size=max(audio_data.nbytes, 1))
+        array = np.ndarray(len(audio_data), dtype=SAMPLE_DTYPE, buffer=block.buf)
+        array[:] = audio_data
+        self._buffers[block.name] = (block, array)
+        return block.name, len(audio_data)
+
+    def update_rate(self, speed_ratio):
+        self.playback_rate = speed_ratio
+        self._send("call", "update_rate", (speed_ratio,), {})
+
+    def set_pitch(self, ratio):
+        self._send("call", "set_pitch", (ratio,), {})
+
+    def set_volume(self, value):
+        self.volume = np.clip(value, 0.0, 1.0)
+        self._send("call", "set_volume", (value,), {})
+
+    def set_downsample(self, target_rate):
+        self._send("call", "set_downsample", (target_rate,), {})
+
+    def set_flanger(self, enabled, lfo_rate=None, depth=None):
+        self._send("call", "set_flanger", (enabled,), {"lfo_rate": lfo_rate, "depth": depth})
+
+    def play(self, audio_data):
+        self._stream = None
+        name, length = self._share(audio_data)
+        self._send("play", name, length,
+                   expected={CURSOR: 0.0, LENGTH: length, PLAYING: True, STREAMING: False})
+
+    def play_stream(self, stream):
+        """the audio process makes its own stream from stream.init_args, this one only gets the timeline"""
+        self._stream = stream
+        self._send("play_stream", type(stream), stream.init_args,
+                   expected={CURSOR: 0.0, LENGTH: stream.length or 0, PLAYING: True, STREAMING: True})
+
+    def get_state(self):
+        self._handle_messages()
+        cursor = self.cursor
+        if self._stream is not None:
+            self._stream.timeline.drop_before(cursor)
+        return self.current_chunk, cursor, self.buffer_length
+
+    def get_stats(self):
+        """whatever the audio process published last, no round trip"""
+        return CallbackStats.unpack(self._status[STATS:]).snapshot()
+
+    def reset_stats(self):
+        self._send("call", "reset_stats", (), {})
+
+    def close(self):
+        if self._process is None:
+            return
+        try:
+            self._conn.send((self._sent + 1, "quit"))
+        except (BrokenPipeError, OSError):
+            pass
+        self._process.join(timeout=1.0)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+        self._conn.close()
+
+        self._scope = self._status = None
+        for block, _ in self._buffers.values():
+            block.close()
+            block.unlink()
+        self._buffers = {}
+        for block in (self._status_block, self._scope_block):
+            block.close()
+            block.unlink()
@@ -0,0 +1,97 @@
+from bisect import bisect_right
+from time import perf_counter
+
+import numpy as np
+
+"""
+Timing for the audio callback. Each call gets measured against its deadline
+(frames / sample_rate) and dropped into a histogram of how much of the deadline it used.
+Only the audio thread writes and the gui just reads snapshots, so there's no locking
+"""
+
+# callback time as a fraction of the block deadline, anything past 1.0 is a late block
+LOAD_BIN_EDGES = [0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0, 1.5, 2.0]
+# what pack() writes, followed by the histogram counts
+PACKED_FIELDS = ("calls", "late", "underflows", "overflows", "total_load", "recent_load",
+                 "max_load", "max_seconds")
+
+
+class CallbackStats:
+    def __init__(self, bin_edges=LOAD_BIN_EDGES):
+        self.bin_edges = list(bin_edges)
+        self.counts = np.zeros(len(self.bin_edges) + 1, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.counts.fill(0)
+        self.calls = 0
+        self.late = 0
+        self.underflows = 0
+        self.overflows = 0
+        self.total_load = 0.0
+        self.max_load = 0.0
+        self.recent_load = 0.0  # smoothed, what the overlay shows as "DSP"
+        self.max_seconds = 0.0
+
+    @staticmethod
+    def now():
+        return perf_counter()
+
+    def record(self, started, frames, sample_rate, status=None):
+        """call at the end of the callback with the perf_counter() value from its start"""
+        elapsed = perf_counter() - started
+        load = elapsed * sample_rate / frames if frames else 0.0
+
+        self.counts[bisect_right(self.bin_edges, load)] += 1
+        self.calls += 1
+        self.total_load += load
+        self.recent_load += 0.05 * (load - self.recent_load)
+        if load > self.max_load:
+            self.max_load = load
+            self.max_seconds = elapsed
+        if load > 1.0:
+            self.late += 1
+
+        if status:
+            if status.output_underflow:
+                self.underflows += 1
+            if status.output_overflow:
+                self.overflows += 1
+
+    def packed_size(self):
+        return len(PACKED_FIELDS) + len(self.counts)
+
+    def pack(self, out):
+        """every number into a float array (shared memory, see audio_process) without a dict"""
+        for index, field in enumerate(PACKED_FIELDS):
+            out[index] = getattr(self, field)
+        out[len(PACKED_FIELDS):self.packed_size()] = self.counts
+
+    @classmethod
+    def unpack(cls, packed, bin_edges=LOAD_BIN_EDGES):
+        """the other end of pack(), a CallbackStats to call snapshot() on"""
+        stats = cls(bin_edges)
+        values = np.array(packed[:stats.packed_size()])  # one copy, the writer keeps going
+        for index, field in enumerate(PACKED_FIELDS):
+            value = float(values[index])
+            setattr(stats, field, value if field.endswith(("load", "seconds")) else int(value))
+        stats.counts[:] = values[len(PACKED_FIELDS):]
+        return stats
+
+    def snapshot(self):
+        """plain copy of everything for whoever is asking (gui, benchmarks...)"""
+        calls = self.calls
+        return {
+            "calls": calls,
+            "late": self.late,
+            "underflows": self.underflows,
+            "overflows": self.overflows,
+            "mean_load": self.total_load / calls if calls else 0.0,
+            "recent_load": self.recent_load,
+            "max_load": self.max_load,
+            "max_ms": self.max_seconds * 1000,
+            "histogram": {
+                "edges": list(self.bin_edges),
+                "counts": self.counts.tolist(),
+            },
+        }
@@ -0,0 +1,240 @@
+import threading
+
+import numpy as np
+import soundfile as sf
+
+from audio_engine import chord_stream, chord_label, Interpolator, PLAYBACK_RATE, SAMPLE_DTYPE
+from timeline import ChordTimeline
+
+"""
+Streaming sources for the AudioPlayer. Instead of one giant pre rendered buffer
+these keep a small ring buffer filled just ahead of the playback cursor by a
+background thread, so memory stays the same no matter how long it plays
+"""
+
+
+class ChordStream:
+    """
+    endless chord progression, renders chords from audio_engine.chord_stream into
+    a ring buffer and keeps a timeline of them so the gui can show what's playing
+    """
+
+    def __init__(self, bpm, root_index, scale_type, wave_choice, sample_rate=PLAYBACK_RATE,
+                 lookahead_seconds=1.0):
+        # enough to build the same stream in another process (see audio_process)
+        self.init_args = (bpm, root_index, scale_type, wave_choice, sample_rate, lookahead_seconds)
+        self.sample_rate = sample_rate
+        self.length = None  # never ends
+        self.samples_per_chord = int((60.0 / bpm) * sample_rate)
+        self._chords = chord_stream(bpm, root_index, scale_type, wave_choice)
+
+        # room for the lookahead plus a chord being written plus whatever the callback still reads
+        self.lookahead = max(int(lookahead_seconds * sample_rate), self.samples_per_chord)
+        self.capacity = self.lookahead + 2 * self.samples_per_chord + 8192
+        self.ring = np.zeros(self.capacity, dtype=SAMPLE_DTYPE)
+
+        self.written = 0    # absolute sample count rendered so far
+        self.consumed = 0   # where the player cursor was last time it told us
+
+        self.timeline = ChordTimeline()
+        self._lerp = Interpolator()
+
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        # render the first chord straight away so playback starts with sound
+        self._render_next()
+        self._running = True
+        self._thread = threading.Thread(target=self._producer, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+
+    def _producer(self):
+        while self._running:
+            if self.written - self.consumed < self.lookahead:
+                self._render_next()
+            else:
+                self._wake.wait(0.05)
+                self._wake.clear()
+
+    def _render_next(self):
+        chord, chord_info = next(self._chords)
+        start = self.written
+        n = len(chord)
+
+        offset = start % self.capacity
+        first = min(n, self.capacity - offset)
+        self.ring[offset:offset + first] = chord[:first]
+        self.ring[:n - first] = chord[first:]
+
+        frequencies = (chord_info["root"], chord_info["third"], chord_info["fifth"])
+        self.timeline.append(start, frequencies, chord_info["quality"],
+                             chord_label(chord_info["quality"], *frequencies))
+        self.timeline.drop_before(self.consumed)  # forget chords the cursor is already past
+
+        self.written = start + n
+
+    def advance(self, cursor, looping=False):
+        """player tells us where it is, wakes the producer if it fell behind"""
+        self.consumed = int(cursor)
+        if self.written - self.consumed < self.lookahead:
+            self._wake.set()
+
+    def read(self, positions, out):
+        """linear interpolation at absolute positions into out, anything not rendered yet is silence"""
+        # positions only go up, so the part that isn't rendered yet is a tail
+        ready = int(np.searchsorted(positions, self.written - 1))
+        self._lerp.lerp_into(self.ring, positions, out, wrap=True)
+        out[ready:] = 0
+        return out
+
+
+class FileStream:
+    """
+    plays a file straight off the disk. blocks get read (and mixed to mono) by a
+    background thread a little ahead of the cursor and dropped once they're behind it,
+    so an hour long recording uses the same memory as a short one
+    """
+
+    def __init__(self, path, sample_rate=PLAYBACK_RATE, block_frames=65536, lookahead_seconds=3.0):
+        self.init_args = (path, sample_rate, block_frames, lookahead_seconds)
+        self.path = path
+        self.sample_rate = sample_rate
+        info = sf.info(str(path))
+        self.file_rate = info.samplerate
+        self.file_frames = info.frames
+        # positions from the player are at our rate, this maps them onto file frames
+        self.ratio = self.file_rate / sample_rate
+        self.length = int(self.file_frames / self.ratio)
+
+        self.block_frames = block_frames
+        self.lookahead_blocks = max(1, int(np.ceil(lookahead_seconds * self.file_rate / block_frames)))
+        self.n_blocks = int(np.ceil(self.file_frames / block_frames))
+
+        self.blocks = {}  # block index -> mono samples, only the reader thread adds/removes
+        self.consumed = 0
+        self.looping = False
+
+        self._file = None
+        self._lerp = Interpolator()
+        self._file_positions = np.empty(0)
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        # returns straight away, even the first blocks come off the disk on the reader thread.
+        # play_stream gets called on the gui thread, and blocks that aren't in yet play as silence
+        self._running = True
+        self._thread = threading.Thread(target=self._reader, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=1.0)
+        self.blocks = {}
+
+    def _wanted_blocks(self):
+        first = int(self.consumed * self.ratio) // self.block_frames
+        wanted = []
+        for block in range(first, first + self.lookahead_blocks + 1):
+            if block >= self.n_blocks:
+                if not self.looping:
+                    break
+                block %= self.n_blocks
+            wanted.append(block)
+        return wanted
+
+    def _fill(self):
+        wanted = self._wanted_blocks()
+        for block in wanted:
+            if not self._running:
+                return
+            if block not in self.blocks:
+                self._file.seek(block * self.block_frames)
+                data = self._file.read(self.block_frames, dtype=SAMPLE_DTYPE, always_2d=True)
+                self.blocks[block] = data.mean(axis=1, dtype=SAMPLE_DTYPE)
+
+        # keep the block right before the cursor too, interpolation can reach back into it
+        keep = set(wanted)
+        if wanted:
+            keep.add((wanted[0] - 1) % self.n_blocks)
+        for block in list(self.blocks):
+            if block not in keep:
+                del self.blocks[block]
+
+    def _reader(self):
+        # the reader owns the file, so a stop() that gives up waiting never closes it mid read
+        self._file = sf.SoundFile(str(self.path))
+        try:
+            while self._running:
+                self._fill()
+                self._wake.wait(0.05)
+                self._wake.clear()
+        finally:
+            self._file.close()
+            self._file = None
+
+    def advance(self, cursor, looping=False):
+        self.consumed = int(cursor)
+        self.looping = looping
+        first = int(self.consumed * self.ratio) // self.block_frames
+        if (first + 1) % self.n_blocks not in self.blocks:
+            self._wake.set()
+
+    def _scratch(self, n):
+        # the callback hands us at most a block at a time, only regrown if that gets bigger
+        if len(self._file_positions) < n:
+            self._file_positions = np.empty(n)
+            self._block_ids = np.empty(n, dtype=np.int64)
+            self._offsets = np.empty(n, dtype=np.int64)
+            self._falling = np.empty(n, dtype=bool)
+
+    def read(self, positions, out):
+        """linear interpolation at player positions into out, blocks that aren't loaded yet read as silence"""
+        n = len(positions)
+        self._scratch(n)
+        file_positions = self._file_positions[:n]
+        np.multiply(positions, self.ratio, out=file_positions)
+        return self._lerp.lerp_into(None, file_positions, out, length=self.file_frames,
+                                    wrap=self.looping, gather=self._gather)
+
+    def _gather(self, frames, out):
+        """out[k] = the sample at file frame frames[k], silence where its block isn't loaded"""
+        n = len(frames)
+        block_ids = self._block_ids[:n]
+        np.floor_divide(frames, self.block_frames, out=block_ids)
+
+        # frames only go up, apart from one drop where a loop wraps round
+        wrap = n
+        if n > 1:
+            falling = self._falling[:n - 1]
+            np.less(frames[1:], frames[:-1], out=falling)
+            if falling.any():
+                wrap = int(falling.argmax()) + 1
+
+        for first, last in ((0, wrap), (wrap, n)):
+            start = first
+            while start < last:
+                block = int(block_ids[start])
+                end = first + int(np.searchsorted(block_ids[first:last], block, side="right"))
+                data = self.blocks.get(block)
+                if data is None:
+                    out[start:end] = 0
+                    self._wake.set()
+                else:
+                    offsets = self._offsets[start:end]
+                    np.subtract(frames[start:end], block * self.block_frames, out=offsets)
+                    np.minimum(offsets, len(data) - 1, out=offsets)
+                    np.take(data, offsets, out=out[start:end], mode="clip")
+                start = end
+        return out
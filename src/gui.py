@@ -1,23 +1,52 @@
+import sqlite3
+import time
 from enum import Enum, auto
 
 import numpy as np
 import pyqtgraph as pg
 from PyQt6.QtWidgets import (QMainWindow, QVBoxLayout, QHBoxLayout, QWidget,
                              QLabel, QPushButton, QComboBox, QSpinBox, QSlider,
-                             QTabWidget, QGroupBox)
+                             QTabWidget, QGroupBox, QLineEdit, QTableWidget, QTableWidgetItem,
+                             QHeaderView, QAbstractItemView)
 from PyQt6.QtCore import QTimer, Qt, pyqtSignal
 from PyQt6.QtGui import QShortcut, QKeySequence
 
 import theme
-from audio_engine import find_note
+from audio_engine import NOTE_NAMES, WAVE_CHOICES
 from audio_player import AudioPlayer
+from audio_process import RemotePlayer
 from audio_controller import PlaybackController
+from timeline import ChordTimeline
 
 
 """
 This just deals with the visual elements of all this
 """
 
+SCOPE_MAX_POINTS = 2048  # more samples than this get min/max decimated before plotting
+STATS_INTERVAL = 0.5  # seconds between fps readout updates
+LIBRARY_COLUMNS = ["Name", "Length", "Rate", "Ch", "Peak"]
+
+
+def peak_decimate(data, max_points):
+    """min and max of each bucket so peaks don't vanish when there are more samples than points"""
+    if len(data) <= max_points:
+        return data
+    buckets = max_points // 2
+    usable = len(data) // buckets * buckets
+    shaped = data[:usable].reshape(buckets, -1)
+    out = np.empty(buckets * 2, dtype=data.dtype)
+    out[0::2] = shaped.min(axis=1)
+    out[1::2] = shaped.max(axis=1)
+    return out
+
+
+def find_trigger(chunk):
+    """first rising zero crossing in the first half of the chunk, so the trace stops jumping around"""
+    half = len(chunk) // 2
+    crossings = np.flatnonzero((chunk[:half] <= 0) & (chunk[1:half + 1] > 0))
+    return int(crossings[0]) + 1 if len(crossings) else 0
+
 
 class PlayState(Enum):
     STOPPED = auto()
@@ -27,7 +56,6 @@ class PlayState(Enum):
 
 class DragValueBox(QLabel):
     valueChanged = pyqtSignal(int)
-    sliderReleased = pyqtSignal()
 
     def __init__(self, min_val, max_val, default_val, snap_step=None, snap_threshold=0):
         super().__init__()
@@ -66,7 +94,6 @@ class DragValueBox(QLabel):
     def wheelEvent(self, event):
         delta = event.angleDelta().y() // 120
         self.set_value(self.current_value + delta * 10)
-        self.sliderReleased.emit()
 
     def mousePressEvent(self, event):
         if event.button() == Qt.MouseButton.LeftButton:
@@ -78,13 +105,9 @@ class DragValueBox(QLabel):
             delta_y = self.drag_start_y - event.pos().y()
             self.set_value(self.drag_start_value + delta_y * 2)
 
-    def mouseReleaseEvent(self, event):
-        if event.button() == Qt.MouseButton.LeftButton:
-            self.sliderReleased.emit()
-
 
 class Oscilloscope(QMainWindow):
-    def __init__(self):
+    def __init__(self, audio_process=False):
         super().__init__()
         self.setWindowTitle("Audio thing")
         self.resize(920, 700)
@@ -97,15 +120,22 @@ class Oscilloscope(QMainWindow):
         self.layout.setContentsMargins(14, 14, 14, 14)
         self.layout.setSpacing(10)
 
-        self.player = AudioPlayer()
-        self.chord_data = []
-        self.samples_per_chord = 0
+        # audio_process puts the player in its own process, away from the gui's GIL
+        self.player = RemotePlayer() if audio_process else AudioPlayer()
+        self.timeline = ChordTimeline(end=0)
         self.current_filename = None
         self.state = PlayState.STOPPED
 
         self.info_label = QLabel("Ready")
         self.info_label.setStyleSheet("font-size: 14px; font-weight: bold; color: white;")
         self.layout.addWidget(self.info_label)
+        self.info_base = "Ready"
+        self._info_text = "Ready"
+
+        self._last_frame = None
+        self._frame_interval = 0.0
+        self._frame_cost = 0.0
+        self._last_stats = 0.0
 
 
         self._init_transport_bar()
@@ -116,14 +146,18 @@ class Oscilloscope(QMainWindow):
 
         self.tab_main = QWidget()
         self.tab_fx = QWidget()
+        self.tab_library = QWidget()
 
         self.tabs.addTab(self.tab_main, "Main Controls")
         self.tabs.addTab(self.tab_fx, "Effects")
+        self.tabs.addTab(self.tab_library, "Library")
 
         self.main_tab_layout = QVBoxLayout(self.tab_main)
         self.main_tab_layout.setSpacing(10)
         self.fx_tab_layout = QVBoxLayout(self.tab_fx)
         self.fx_tab_layout.setSpacing(10)
+        self.library_tab_layout = QVBoxLayout(self.tab_library)
+        self.library_tab_layout.setSpacing(8)
 
         self.layout.addWidget(self.tabs)
 
@@ -133,17 +167,30 @@ class Oscilloscope(QMainWindow):
         self.graph.showAxis('bottom', False)
         self.graph.showGrid(x=True, y=True, alpha=0.3)
         self.layout.addWidget(self.graph, stretch=1)
+        # one curve for the whole session, update_plot just swaps its data
+        self.curve = self.graph.plot(pen=theme.PINK)
+        self.dsp_overlay = pg.TextItem(color="#aaa", anchor=(1, 0))
+        self.dsp_overlay.setVisible(False)
+        self.graph.addItem(self.dsp_overlay, ignoreBounds=True)
 
         self._init_source_controls()
         self._init_speed_controls()
         self._init_downsample_controls()
         self._init_flanger_controls()
+        self._init_library_controls()
 
         self.controller = PlaybackController(self)
         self.play_button.clicked.connect(self.handle_play_pause)
         self.wave_combo.currentIndexChanged.connect(self.force_play)
-        self.downsample_slider.sliderReleased.connect(lambda: self.controller.start_playback(keep_position=True))
+        self.downsample_slider.valueChanged.connect(self.controller.update_effects)
+        self.flanger_rate_slider.valueChanged.connect(self.controller.update_effects)
+        self.flanger_depth_slider.valueChanged.connect(self.controller.update_effects)
         self.select_file_btn.clicked.connect(self.controller.select_file)
+        self.library_add_btn.clicked.connect(self.controller.add_library_folder)
+        self.library_rescan_btn.clicked.connect(self.controller.rescan_library)
+        self.controller.library_progress.connect(self.update_library_progress)
+        self.controller.library_scanned.connect(self.finish_library_scan)
+        self.refresh_library()
         QShortcut(QKeySequence(Qt.Key.Key_Space), self).activated.connect(self.handle_play_pause)
 
         self.timer = QTimer()
@@ -169,8 +216,29 @@ class Oscilloscope(QMainWindow):
         self.loop_button.clicked.connect(self.toggle_loop)
         self.top_transport_layout.addWidget(self.loop_button)
 
+        self.trigger_button = QPushButton("Trigger: OFF")
+        self.trigger_button.setMinimumHeight(40)
+        self.trigger_button.setCheckable(True)
+        self.trigger_button.setStyleSheet(theme.toggle_style(is_on=False))
+        self.trigger_button.setToolTip("Line the scope up on a rising zero crossing")
+        self.trigger_button.clicked.connect(self.toggle_trigger)
+        self.top_transport_layout.addWidget(self.trigger_button)
+
+        self.dsp_button = QPushButton("DSP: OFF")
+        self.dsp_button.setMinimumHeight(40)
+        self.dsp_button.setCheckable(True)
+        self.dsp_button.setStyleSheet(theme.toggle_style(is_on=False))
+        self.dsp_button.setToolTip("Show how much of each audio block's deadline the callback uses")
+        self.dsp_button.clicked.connect(self.toggle_dsp_overlay)
+        self.top_transport_layout.addWidget(self.dsp_button)
+
         self.top_transport_layout.addStretch()
 
+        self.frame_stats_label = QLabel("")
+        self.frame_stats_label.setStyleSheet("color: #777; font-size: 11px;")
+        self.frame_stats_label.setToolTip("Scope refresh rate and time spent drawing each frame")
+        self.top_transport_layout.addWidget(self.frame_stats_label)
+
         vol_icon = QLabel("Vol")
         vol_icon.setStyleSheet("color: #aaa; font-size: 13px;")
         self.top_transport_layout.addWidget(vol_icon)
@@ -202,7 +270,7 @@ class Oscilloscope(QMainWindow):
         row.addWidget(self.bpm_input)
 
         self.root_combo = QComboBox()
-        self.root_combo.addItems(['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B'])
+        self.root_combo.addItems(NOTE_NAMES)
         row.addWidget(QLabel("Key:"))
         row.addWidget(self.root_combo)
 
@@ -211,18 +279,21 @@ class Oscilloscope(QMainWindow):
         row.addWidget(self.scale_combo)
 
         self.wave_combo = QComboBox()
-        self.wave_combo.addItems([
-            "Random (All)", "Sine", "Square", "Triangle", "Saw",
-            "Sine + Triangle", "Square + Saw", "White Noise",
-            "play file"
-        ])
+        self.wave_combo.addItems(WAVE_CHOICES + ["play file"])
         row.addWidget(QLabel("Wave:"))
         row.addWidget(self.wave_combo)
 
+        self.endless_button = QPushButton("Endless: OFF")
+        self.endless_button.setCheckable(True)
+        self.endless_button.setStyleSheet(theme.toggle_style(is_on=False) + " padding: 0px 10px;")
+        self.endless_button.setToolTip("Keep generating chords forever instead of 32")
+        self.endless_button.clicked.connect(self.toggle_endless)
+        row.addWidget(self.endless_button)
+
         row.addStretch()
 
         self.select_file_btn = QPushButton("Load File...")
-        self.select_file_btn.setToolTip("Pick a .wav file and switch to it")
+        self.select_file_btn.setToolTip("Pick an audio or MIDI file and switch to it")
         row.addWidget(self.select_file_btn)
 
         group.setLayout(row)
@@ -247,10 +318,18 @@ class Oscilloscope(QMainWindow):
         self.effective_bpm_label = QLabel("")
         self.effective_bpm_label.setStyleSheet("color: #aaa; font-size: 12px;")
 
+        self.link_button = QPushButton("Link: ON")
+        self.link_button.setCheckable(True)
+        self.link_button.setChecked(True)
+        self.link_button.setStyleSheet(theme.toggle_style(is_on=True) + " padding: 0px 10px;")
+        self.link_button.setToolTip("On: pitch follows speed like a record\nOff: speed and pitch move separately")
+        self.link_button.clicked.connect(self.toggle_link)
+
         row.addWidget(QLabel("Speed:"))
         row.addWidget(self.speed_slider)
         row.addWidget(QLabel("Pitch:"))
         row.addWidget(self.cents_slider)
+        row.addWidget(self.link_button)
         row.addWidget(self.effective_bpm_label)
         row.addStretch()
 
@@ -273,7 +352,6 @@ class Oscilloscope(QMainWindow):
         self.downsample_slider.setValue(44100)
         self.downsample_slider.setToolTip("Lower = more lo-fi / aliased")
         self.downsample_slider.valueChanged.connect(self.update_downsample)
-        self.downsample_slider.sliderReleased.connect(lambda: self.controller.start_playback(keep_position=True))
 
         row.addWidget(self.downsample_slider)
         row.addWidget(self.downsample_label)
@@ -304,7 +382,6 @@ class Oscilloscope(QMainWindow):
         self.flanger_rate_slider.setMaximum(100)
         self.flanger_rate_slider.setValue(5)
         self.flanger_rate_slider.valueChanged.connect(self.update_flanger_rate)
-        self.flanger_rate_slider.sliderReleased.connect(lambda: self.controller.start_playback(keep_position=True))
 
         self.flanger_depth_label = QLabel("Depth: 4 ms")
         self.flanger_depth_label.setFixedWidth(90)
@@ -313,7 +390,6 @@ class Oscilloscope(QMainWindow):
         self.flanger_depth_slider.setMaximum(20)
         self.flanger_depth_slider.setValue(4)
         self.flanger_depth_slider.valueChanged.connect(self.update_flanger_depth)
-        self.flanger_depth_slider.sliderReleased.connect(lambda: self.controller.start_playback(keep_position=True))
 
         sliders.addWidget(QLabel("LFO"))
         sliders.addWidget(self.flanger_rate_slider)
@@ -326,6 +402,97 @@ class Oscilloscope(QMainWindow):
         self.fx_tab_layout.addWidget(group)
         self.fx_tab_layout.addStretch()
 
+    def _init_library_controls(self):
+        row = QHBoxLayout()
+        row.setSpacing(10)
+
+        self.library_search = QLineEdit()
+        self.library_search.setPlaceholderText("Search the library…")
+        self.library_search.setClearButtonEnabled(True)
+        self.library_search.textChanged.connect(self.refresh_library)
+        row.addWidget(self.library_search, stretch=1)
+
+        self.library_add_btn = QPushButton("Add Folder...")
+        self.library_add_btn.setToolTip("Index every audio / MIDI file under a folder")
+        row.addWidget(self.library_add_btn)
+
+        self.library_rescan_btn = QPushButton("Rescan")
+        self.library_rescan_btn.setToolTip("Pick up files that were added, changed or deleted")
+        row.addWidget(self.library_rescan_btn)
+
+        self.library_status = QLabel("")
+        self.library_status.setStyleSheet("color: #aaa; font-size: 12px;")
+        row.addWidget(self.library_status)
+        self.library_tab_layout.addLayout(row)
+
+        self.library_table = QTableWidget(0, len(LIBRARY_COLUMNS))
+        self.library_table.setHorizontalHeaderLabels(LIBRARY_COLUMNS)
+        self.library_table.verticalHeader().setVisible(False)
+        self.library_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        self.library_table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.library_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        self.library_table.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.library_table.setToolTip("Double click to play")
+        self.library_table.currentCellChanged.connect(self.show_library_thumbnail)
+        self.library_table.cellDoubleClicked.connect(self.play_library_row)
+        self.library_tab_layout.addWidget(self.library_table, stretch=1)
+
+        self.library_thumbnail = pg.PlotWidget()
+        self.library_thumbnail.setFixedHeight(56)
+        self.library_thumbnail.setYRange(-1, 1)
+        self.library_thumbnail.hideAxis('left')
+        self.library_thumbnail.hideAxis('bottom')
+        self.library_thumbnail.setMouseEnabled(False, False)
+        self.library_thumbnail_curve = self.library_thumbnail.plot(pen=theme.PINK)
+        self.library_tab_layout.addWidget(self.library_thumbnail)
+        self.library_entries = []
+
+    def refresh_library(self):
+        """reruns the search, it's an indexed query so every keystroke can do it"""
+        try:
+            self.library_entries = self.controller.library.search(self.library_search.text())
+        except sqlite3.Error as e:
+            self.library_status.setText(f"Library unavailable: {e}")
+            return
+        table = self.library_table
+        table.setUpdatesEnabled(False)
+        table.setRowCount(len(self.library_entries))
+        for row, entry in enumerate(self.library_entries):
+            minutes, seconds = divmod(entry.duration or 0.0, 60)
+            peak = "" if not entry.peak else f"{20 * np.log10(entry.peak):.1f} dB"
+            cells = [entry.name, f"{minutes:.0f}:{seconds:04.1f}",
+                     "MIDI" if not entry.sample_rate else f"{entry.sample_rate} Hz",
+                     str(entry.channels), peak]
+            for column, text in enumerate(cells):
+                table.setItem(row, column, QTableWidgetItem(text))
+        table.setUpdatesEnabled(True)
+        self.library_thumbnail_curve.setData([])
+
+    def show_library_thumbnail(self, row, *_):
+        overview = None
+        if 0 <= row < len(self.library_entries):
+            try:
+                overview = self.controller.library.thumbnail(self.library_entries[row].path)
+            except sqlite3.Error as e:
+                self.library_status.setText(f"Library unavailable: {e}")
+        self.library_thumbnail_curve.setData([] if overview is None else overview.reshape(-1))
+
+    def play_library_row(self, row, _column):
+        self.controller.open_file(self.library_entries[row].path)
+
+    def update_library_progress(self, done, total):
+        self.library_status.setText(f"Scanning {done}/{total}")
+
+    def finish_library_scan(self, result):
+        if isinstance(result, Exception):
+            self.library_status.setText(f"Scan failed: {result}")
+        else:
+            scanned = sum(summary.scanned for summary in result)
+            failed = sum(summary.failed for summary in result)
+            text = f"{scanned} new or changed" if scanned else "Up to date"
+            self.library_status.setText(text + (f", {failed} unreadable" if failed else ""))
+        self.refresh_library()
+
     def update_flanger_rate(self, value):
         self.flanger_rate_label.setText(f"Rate: {value / 10.0:.1f} Hz")
 
@@ -344,6 +511,8 @@ class Oscilloscope(QMainWindow):
 
         self.speed_slider.setText(f"{float_percent:.1f}%")
         self.effective_bpm_label.setText(f"({effective_bpm} BPM)")
+        if not self.link_button.isChecked():
+            return  # pitch stays where it is, the shifter makes up the difference
 
         self.cents_slider.blockSignals(True)
         self.cents_slider.setValue(cents)
@@ -359,6 +528,9 @@ class Oscilloscope(QMainWindow):
 
         sign = "+" if cents >= 0 else ""
         self.cents_slider.setText(f"{sign}{cents}\u00a2")
+        if not self.link_button.isChecked():
+            self.update_player_rate()
+            return
 
         self.speed_slider.blockSignals(True)
         self.speed_slider.setValue(slider_val)
@@ -374,30 +546,89 @@ class Oscilloscope(QMainWindow):
         speed_ratio = (value / 10.0) / 100.0
         self.player.update_rate(speed_ratio)
 
+        # reading faster already raises the pitch by speed_ratio, the shifter only does the rest
+        if self.link_button.isChecked():
+            self.player.set_pitch(1.0)
+        else:
+            self.player.set_pitch(2 ** (self.cents_slider.value() / 1200.0) / speed_ratio)
+
+    def toggle_link(self, checked):
+        self.link_button.setText("Link: ON" if checked else "Link: OFF")
+        self.link_button.setStyleSheet(theme.toggle_style(is_on=checked) + " padding: 0px 10px;")
+        if checked:
+            self.update_speed(self.speed_slider.value())  # pitch snaps back to follow the speed
+        self.update_player_rate()
+
     def update_volume(self, value):
         self.volume_label.setText(f"{value}%")
         volume_float = value / 100.0
         self.player.set_volume(volume_float)
 
+    def set_info(self, text):
+        """status line text, the bit before the first | stays put while the live readout updates"""
+        self.info_base = text.split("|")[0].strip()
+        self._show_info(text)
+
+    def _show_info(self, text):
+        # setText relayouts the label, skip it when nothing changed
+        if text != self._info_text:
+            self._info_text = text
+            self.info_label.setText(text)
+
     def update_plot(self):
+        started = time.perf_counter()
+        if self._last_frame is not None:
+            self._frame_interval += 0.1 * ((started - self._last_frame) - self._frame_interval)
+        self._last_frame = started
+
+        self._draw_frame()
+
+        finished = time.perf_counter()
+        self._frame_cost += 0.1 * ((finished - started) - self._frame_cost)
+        if finished - self._last_stats >= STATS_INTERVAL and self._frame_interval > 0:
+            self._last_stats = finished
+            self.frame_stats_label.setText(
+                f"{1.0 / self._frame_interval:.0f} fps | {self._frame_cost * 1000:.1f} ms/frame")
+            if self.dsp_button.isChecked():
+                self._update_dsp_overlay()
+
+    def _update_dsp_overlay(self):
+        stats = self.player.get_stats()
+        self.dsp_overlay.setText(
+            f"DSP {stats['recent_load'] * 100:.0f}% (peak {stats['max_load'] * 100:.0f}%, "
+            f"{stats['max_ms']:.2f} ms)\n"
+            f"late blocks {stats['late']} | underflows {stats['underflows']} | "
+            f"overflows {stats['overflows']}")
+        (_, x_max), (_, y_max) = self.graph.getViewBox().viewRange()
+        self.dsp_overlay.setPos(x_max, y_max)
+
+    def _draw_frame(self):
         chunk, cursor, buffer_len = self.player.get_state()
-        self.graph.clear()
-        self.graph.plot(chunk, pen=theme.PINK)
+        if self.trigger_button.isChecked():
+            start = find_trigger(chunk)
+            chunk = chunk[start:start + len(chunk) // 2]
+        self.curve.setData(peak_decimate(chunk, SCOPE_MAX_POINTS))
+
+        if self.controller.is_rendering:
+            # keep the "Rendering…" text up until the new audio lands
+            return
+
+        event = self.timeline.label_at(cursor)
+        if self.timeline.end is None:
+            # endless, no percentage to show
+            if event is not None:
+                number, label = event
+                self._show_info(f"{self.info_base} | chord {number + 1} | {label}")
+            return
 
         if buffer_len == 0:
             return
 
         progress = (cursor / buffer_len) * 100
-        index = int(cursor // self.samples_per_chord) if self.samples_per_chord > 0 else 0
-
-        if index < len(self.chord_data):
-            chord = self.chord_data[index]
-            root, third, fifth = find_note(chord['root']), find_note(chord['third']), find_note(chord['fifth'])
-            base = self.info_label.text().split("|")[0].strip()
-            self.info_label.setText(
-                f"{base} | {progress:.0f}% | {chord['note_name']} {chord['quality']} ({root},{third},{fifth})")
+        if event is not None:
+            self._show_info(f"{self.info_base} | {progress:.0f}% | {event[1]}")
         else:
-            self.info_label.setText("doneeee")
+            self._show_info("doneeee")
             # only reset to the "fresh start" look if playback ran out on its
             # own - if the user paused, we want to stay in the paused state
             if not self.player.is_playing and self.state != PlayState.PAUSED:
@@ -408,10 +639,28 @@ class Oscilloscope(QMainWindow):
         self.loop_button.setText("Loop: Yes" if checked else "Loop: Nah")
         self.loop_button.setStyleSheet(theme.toggle_style(is_on=checked))
 
+    def toggle_trigger(self, checked):
+        self.trigger_button.setText("Trigger: ON" if checked else "Trigger: OFF")
+        self.trigger_button.setStyleSheet(theme.toggle_style(is_on=checked))
+
+    def toggle_dsp_overlay(self, checked):
+        self.dsp_button.setText("DSP: ON" if checked else "DSP: OFF")
+        self.dsp_button.setStyleSheet(theme.toggle_style(is_on=checked))
+        self.dsp_overlay.setVisible(checked)
+        if checked:
+            self.player.reset_stats()
+            self._update_dsp_overlay()
+
+    def toggle_endless(self, checked):
+        self.endless_button.setText("Endless: ON" if checked else "Endless: OFF")
+        self.endless_button.setStyleSheet(theme.toggle_style(is_on=checked) + " padding: 0px 10px;")
+        if self.state != PlayState.STOPPED:
+            self.force_play()
+
     def toggle_flanger(self, checked):
         self.flanger_button.setText("flanger: ON" if checked else "flanger: OFF")
         self.flanger_button.setStyleSheet(theme.toggle_style(is_on=checked) + " padding: 0px 15px;")
-        self.controller.start_playback(keep_position=True)
+        self.controller.update_effects()
 
     def _set_state(self, new_state: PlayState):
         self.state = new_state
@@ -429,20 +678,19 @@ class Oscilloscope(QMainWindow):
         if self.state == PlayState.PLAYING:
             self.player.is_playing = False
             self._set_state(PlayState.PAUSED)
-        elif self.state == PlayState.PAUSED and self.player.buffer_length > 0:
+        elif self.state == PlayState.PAUSED and (self.player.buffer_length > 0 or self.player.is_streaming):
             self.player.is_playing = True
             self._set_state(PlayState.PLAYING)
         else:
-            self.controller.start_playback(keep_position=False)
+            self.controller.start_playback()
             self._set_state(PlayState.PLAYING)
 
     def force_play(self):
         """switches whatever is playing rn if pauses switch but stay paused"""
         was_paused = self.state == PlayState.PAUSED
-        self.controller.start_playback(keep_position=False)
+        self.controller.start_playback(paused=was_paused)
 
         if was_paused:
-            self.player.is_playing = False
             self._set_state(PlayState.PAUSED)
         else:
             self._set_state(PlayState.PLAYING)
\ No newline at end of file
@@ -0,0 +1,315 @@
+import multiprocessing
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import soundfile as sf
+
+from audio_loader import CACHE_DIR
+from midi import MIDI_SUFFIXES, read_midi
+from peaks import BUILD_CHUNK, bucket_peaks, thumbnail
+
+"""
+sample library: an sqlite index of every audio/midi file under the folders you add.
+
+scan_folder walks a folder, skips files whose mtime and size haven't changed since the
+last scan, and reads the rest on a process pool. each file gets read once, a block at a
+time, for its duration, rate, channels, peak, rms and a little min/max overview. only the
+scanning process writes to the database, the gui just runs queries against it, so
+searching thousands of files never touches the files themselves. names are searched
+through a trigram full text index
+"""
+
+LIBRARY_DB = CACHE_DIR / "library.sqlite3"
+LIBRARY_VERSION = 2  # bump when the columns change, the old index just gets rebuilt
+AUDIO_SUFFIXES = (".wav", ".flac", ".ogg", ".aif", ".aiff", ".mp3")
+THUMBNAIL_POINTS = 200
+SEARCH_LIMIT = 2000
+WRITE_BATCH = 64  # rows per commit while scanning
+
+COLUMNS = ("path", "folder", "name", "mtime_ns", "size", "duration", "sample_rate", "channels",
+           "peak", "rms", "thumbnail", "error")
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    folder TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    duration REAL,
+    sample_rate INTEGER,
+    channels INTEGER,
+    peak REAL,
+    rms REAL,
+    thumbnail BLOB,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS files_name ON files (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS folders (path TEXT PRIMARY KEY);
+
+-- trigram full text index over the names so "%word%" searches don't scan every row.
+-- it follows files through triggers, which is why rows get upserted and never replaced
+CREATE VIRTUAL TABLE IF NOT EXISTS names USING fts5(
+    name, content='files', content_rowid='rowid', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS files_added AFTER INSERT ON files BEGIN
+    INSERT INTO names (rowid, name) VALUES (new.rowid, new.name);
+END;
+CREATE TRIGGER IF NOT EXISTS files_removed AFTER DELETE ON files BEGIN
+    INSERT INTO names (names, rowid, name) VALUES ('delete', old.rowid, old.name);
+END;
+CREATE TRIGGER IF NOT EXISTS files_renamed AFTER UPDATE OF name ON files BEGIN
+    INSERT INTO names (names, rowid, name) VALUES ('delete', old.rowid, old.name);
+    INSERT INTO names (rowid, name) VALUES (new.rowid, new.name);
+END;
+PRAGMA user_version = {LIBRARY_VERSION};
+"""
+TRIGRAM = 3  # search words shorter than this can't use the trigram index
+
+@dataclass
+class LibraryEntry:
+    path: str
+    name: str
+    duration: float
+    sample_rate: int  # 0 for midi
+    channels: int     # midi channels used, for midi files
+    peak: float       # None for midi
+    rms: float
+
+
+@dataclass
+class ScanSummary:
+    scanned: int
+    unchanged: int
+    removed: int
+    failed: int
+
+
+def open_index(db_path=None):
+    """
+    connection for the scanner, the only thing that writes. makes the tables, and throws
+    an index from an older version away, so the gui's read side never has to
+    """
+    db_path = Path(db_path or LIBRARY_DB)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(str(db_path), timeout=10)
+    # wal so the gui can keep searching while a scan writes, it sticks to the file
+    db.execute("PRAGMA journal_mode=WAL")
+    version = db.execute("PRAGMA user_version").fetchone()[0]
+    if version != LIBRARY_VERSION:
+        db.executescript("DROP TABLE IF EXISTS names; DROP TABLE IF EXISTS files; DROP TABLE IF EXISTS folders;")
+        db.executescript(_SCHEMA)
+    return db
+
+
+def scan_file(path):
+    """
+    one row for the files table, read errors go in the error column instead of raising.
+    None if the file is gone
+    """
+    path = Path(path)
+    row = dict.fromkeys(COLUMNS)
+    row.update(path=str(path), folder=str(path.parent), name=path.name)
+    try:
+        stat = path.stat()
+    except OSError:
+        return None  # deleted since the folder got walked, the next scan drops it
+    row.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+    try:
+        if path.suffix.lower() in MIDI_SUFFIXES:
+            midi = read_midi(path)
+            row.update(duration=midi.duration, sample_rate=0, channels=len(np.unique(midi.channels)))
+        else:
+            row.update(_scan_audio(path))
+    except Exception as e:
+        # a broken file only costs its own row, an escaped error would end the whole map
+        row["error"] = str(e) or type(e).__name__
+    return tuple(row[column] for column in COLUMNS)
+
+
+def _scan_audio(path):
+    peak, squares, frames = 0.0, 0.0, 0
+    peaks = []
+    with sf.SoundFile(str(path)) as f:
+        rate, channels = f.samplerate, f.channels
+        # blocks are a multiple of PEAK_BUCKET so the overview lines up across them
+        for block in f.blocks(blocksize=BUILD_CHUNK, dtype="float32", always_2d=True):
+            if len(block) == 0:
+                continue
+            frames += len(block)
+            peak = max(peak, float(np.abs(block).max()))
+            flat = block.reshape(-1)
+            squares += float(np.dot(flat, flat))
+            peaks.append(bucket_peaks(block.mean(axis=1) if channels > 1 else block[:, 0]))
+
+    overview = thumbnail(np.concatenate(peaks), THUMBNAIL_POINTS) if peaks else np.zeros((0, 2), np.float32)
+    return dict(
+        duration=frames / rate,
+        sample_rate=rate,
+        channels=channels,
+        peak=peak,
+        rms=float(np.sqrt(squares / max(frames * channels, 1))),
+        thumbnail=overview.tobytes(),
+    )
+
+
+def _files_under(folder):
+    """path -> (mtime_ns, size) for every file the library can read under folder"""
+    found = {}
+    suffixes = AUDIO_SUFFIXES + MIDI_SUFFIXES
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if name.lower().endswith(suffixes):
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                found[path] = (stat.st_mtime_ns, stat.st_size)
+    return found
+
+
+def scan_folder(folder, db_path=None, workers=None, progress=None):
+    """
+    brings the index for folder up to date. progress(done, total) gets called as rows land,
+    total being the files that needed reading
+    """
+    folder = str(Path(folder).resolve())
+    prefix = os.path.join(folder, "")
+    with closing(open_index(db_path)) as db:
+        with db:
+            db.execute("INSERT OR IGNORE INTO folders VALUES (?)", (folder,))
+        known = {path: (mtime, size) for path, mtime, size in db.execute(
+            "SELECT path, mtime_ns, size FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))}
+
+        on_disk = _files_under(folder)
+        changed = sorted(path for path, key in on_disk.items() if known.get(path) != key)
+        removed = [path for path in known if path not in on_disk]
+        with db:
+            db.executemany("DELETE FROM files WHERE path = ?", [(path,) for path in removed])
+
+        failed = 0
+        if changed:
+            if progress is not None:
+                progress(0, len(changed))
+            # an upsert keeps the rowid, so the update trigger keeps the names index right
+            insert = (f"INSERT INTO files VALUES ({', '.join('?' * len(COLUMNS))}) "
+                      f"ON CONFLICT (path) DO UPDATE SET "
+                      + ", ".join(f"{column} = excluded.{column}" for column in COLUMNS[1:]))
+            batch = []
+            # spawn, this can get called from the gui and forking a qt process isn't safe
+            context = multiprocessing.get_context("spawn")
+            workers = workers or os.cpu_count() or 1
+            chunksize = max(1, min(32, len(changed) // (4 * workers)))
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+                for done, row in enumerate(executor.map(scan_file, changed, chunksize=chunksize), 1):
+                    if row is not None:
+                        batch.append(row)
+                        failed += row[-1] is not None
+                    if len(batch) >= WRITE_BATCH or done == len(changed):
+                        with db:
+                            db.executemany(insert, batch)
+                        batch = []
+                        if progress is not None:
+                            progress(done, len(changed))
+
+    return ScanSummary(scanned=len(changed), unchanged=len(on_disk) - len(changed),
+                       removed=len(removed), failed=failed)
+
+
+class SampleLibrary:
+    """
+    read side of the index. one connection that only ever runs selects, so with the
+    index in wal mode a running scan never holds up a search
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = Path(db_path or LIBRARY_DB)
+        self._db = None
+
+    def _reader(self):
+        """the query connection, None until a scan has made the index"""
+        if self._db is None:
+            if not self.db_path.exists():
+                return None
+            db = sqlite3.connect(str(self.db_path), timeout=1)
+            db.execute("PRAGMA query_only = ON")
+            self._db = db
+        if self._db.execute("PRAGMA user_version").fetchone()[0] != LIBRARY_VERSION:
+            return None  # older index, the next scan rebuilds it
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def search(self, text="", limit=SEARCH_LIMIT):
+        """files whose name has every word of text in it, readable ones only"""
+        db = self._reader()
+        if db is None:
+            return []
+        words = text.split()
+        # long words go through the trigram index, short ones just filter what that finds
+        indexed = [word for word in words if len(word) >= TRIGRAM]
+        where, params = ["error IS NULL"], []
+        if indexed:
+            where.append("rowid IN (SELECT rowid FROM names WHERE names MATCH ?)")
+            params.append(" ".join('"' + word.replace('"', '""') + '"' for word in indexed))
+        for word in words:
+            if len(word) < TRIGRAM:
+                where.append("name LIKE ? ESCAPE '\\'")
+                escaped = word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                params.append(f"%{escaped}%")
+        rows = db.execute(
+            f"SELECT path, name, duration, sample_rate, channels, peak, rms FROM files "
+            f"WHERE {' AND '.join(where)} ORDER BY name COLLATE NOCASE LIMIT ?",
+            params + [limit],
+        ).fetchall()
+        return [LibraryEntry(*row) for row in rows]
+
+    def thumbnail(self, path):
+        """(points, 2) min/max overview of a file, None for midi and unknown files"""
+        db = self._reader()
+        if db is None:
+            return None
+        row = db.execute("SELECT thumbnail FROM files WHERE path = ?", (str(path),)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return np.frombuffer(row[0], dtype=np.float32).reshape(-1, 2)
+
+    def folders(self):
+        db = self._reader()
+        if db is None:
+            return []
+        return [path for (path,) in db.execute("SELECT path FROM folders ORDER BY path")]
+
+    def __len__(self):
+        db = self._reader()
+        if db is None:
+            return 0
+        return db.execute("SELECT count(*) FROM files WHERE error IS NULL").fetchone()[0]
+
+    def scan(self, folder, workers=None, progress=None):
+        return scan_folder(folder, self.db_path, workers, progress)
+
+    def rescan(self, workers=None, progress=None):
+        """
+        every folder added so far, folders that are gone get dropped along with their files.
+        runs on the scan thread, so it uses its own connection rather than the reader
+        """
+        with closing(open_index(self.db_path)) as db:
+            folders = [path for (path,) in db.execute("SELECT path FROM folders ORDER BY path")]
+            for folder in folders:
+                if not os.path.isdir(folder):
+                    prefix = os.path.join(folder, "")
+                    with db:
+                        db.execute("DELETE FROM folders WHERE path = ?", (folder,))
+                        db.execute("DELETE FROM files WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))
+        return [scan_folder(folder, self.db_path, workers, progress)
+                for folder in folders if os.path.isdir(folder)]
@@ -1,9 +1,48 @@
+import time
+
+STARTED = time.perf_counter()
+
+import json
+import os
 import sys
+from PyQt6.QtCore import QTimer
 from PyQt6.QtWidgets import QApplication
 from gui import Oscilloscope
 
+FIRST_SOUND_TIMEOUT = 10.0
+
+
+def run_startup_benchmark(app, window):
+    """
+    --startup-benchmark: once the window is up hit play, wait for the first non silent
+    block out of the player, print the timings as json and quit
+    """
+    timings = {"first_window": time.perf_counter() - STARTED, "first_sound": None}
+    window.force_play()
+
+    def poll():
+        elapsed = time.perf_counter() - STARTED
+        if window.player.current_chunk.any():
+            timings["first_sound"] = elapsed
+        elif elapsed - timings["first_window"] < FIRST_SOUND_TIMEOUT:
+            return
+        poller.stop()
+        print(json.dumps(timings), flush=True)
+        app.quit()
+
+    poller = QTimer(window)  # parented so it isn't garbage collected when we return
+    poller.setInterval(1)
+    poller.timeout.connect(poll)
+    poller.start()
+
+
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = Oscilloscope()
+    # --audio-process (or SATIN_AUDIO_PROCESS=1) runs playback in its own process
+    audio_process = "--audio-process" in sys.argv or os.environ.get("SATIN_AUDIO_PROCESS") == "1"
+    window = Oscilloscope(audio_process=audio_process)
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    if "--startup-benchmark" in sys.argv:
+        # singleShot(0) fires once the event loop has actually shown the window
+        QTimer.singleShot(0, lambda: run_startup_benchmark(app, window))
+    sys.exit(app.exec())
@@ -0,0 +1,362 @@
+import struct
+from dataclasses import dataclass
+
+import numpy as np
+
+from audio_engine import (PLAYBACK_RATE, SAMPLE_DTYPE, TONE_SHAPES, _table_lookup, _table_phase,
+                          _table_size, _wavetable, chord_label, chord_qualities, find_note, get_tone, midi_to_frequency)
+from timeline import ChordTimeline
+
+"""
+plays standard midi files through the same wavetables as the chord player.
+
+read_midi turns the file into arrays of notes (seconds, note number, velocity, channel).
+render_midi hands every note a voice slot out of a fixed pool (stealing the oldest note
+when it runs out, which cuts it off) and then renders a block at a time with one row per
+slot, so a block never costs more than the pool size however many notes the file has
+"""
+
+MIDI_BLOCK = 4096  # samples rendered per pass
+MAX_VOICES = 32
+VOICE_AMPLITUDE = 0.09  # same level a chord voice gets (0.3 * 0.3)
+FADE_SAMPLES = 100  # same click guard as the chords
+ONSET_WINDOW = 0.03  # notes starting this close together count as one chord on the timeline
+DRUM_CHANNEL = 9
+MIDI_SUFFIXES = (".mid", ".midi")
+
+# with no wave picked (playing the file as is) every channel gets its own oscillator
+CHANNEL_SHAPES = ["sine", "square", "triangle", "saw"]
+
+
+class MidiError(ValueError):
+    pass
+
+
+@dataclass
+class MidiNotes:
+    """one row per note, sorted by start"""
+    starts: np.ndarray     # seconds
+    ends: np.ndarray       # seconds
+    notes: np.ndarray      # midi note numbers
+    velocities: np.ndarray  # 1..127
+    channels: np.ndarray
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def duration(self):
+        return float(self.ends.max()) if len(self.ends) else 0.0
+
+
+def _read_varlen(data, pos):
+    value = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            return value, pos
+
+
+def _read_track(data):
+    """(tick, kind, a, b, channel) for note on/off and tempo events, everything else is skipped"""
+    events = []
+    pos, tick, status = 0, 0, None
+    while pos < len(data):
+        delta, pos = _read_varlen(data, pos)
+        tick += delta
+        byte = data[pos]
+        if byte & 0x80:
+            status = byte
+            pos += 1
+        elif status is None:
+            raise MidiError("Running status without a status byte")
+
+        if status == 0xFF:
+            kind = data[pos]
+            length, pos = _read_varlen(data, pos + 1)
+            if kind == 0x51 and length == 3:
+                events.append((tick, "tempo", int.from_bytes(data[pos:pos + 3], "big"), 0, 0))
+            elif kind == 0x2F:
+                break
+            pos += length
+            status = None  # meta and sysex events cancel running status
+        elif status in (0xF0, 0xF7):
+            length, pos = _read_varlen(data, pos)
+            pos += length
+            status = None
+        else:
+            kind, channel = status & 0xF0, status & 0x0F
+            if kind in (0xC0, 0xD0):  # program change / channel pressure have one data byte
+                pos += 1
+                continue
+            a, b = data[pos], data[pos + 1]
+            pos += 2
+            if kind == 0x90 and b > 0:
+                events.append((tick, "on", a, b, channel))
+            elif kind == 0x80 or kind == 0x90:
+                events.append((tick, "off", a, 0, channel))
+    return events
+
+
+def read_midi(path, include_drums=False):
+    """parses a standard midi file (format 0 or 1) into MidiNotes"""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    if data[:4] != b"MThd":
+        raise MidiError(f"{path} is not a standard midi file")
+    if len(data) < 14:
+        raise MidiError("Header chunk is cut short")
+    header_length, _, n_tracks, division = struct.unpack(">IHHh", data[4:14])
+    if division == 0 or (division < 0 and division & 0xFF == 0):
+        raise MidiError("Header has no time division")
+    pos = 8 + header_length
+
+    events = []
+    tracks = 0
+    while tracks < n_tracks:
+        if pos + 8 > len(data):
+            raise MidiError(f"Expected {n_tracks} track chunks, found {tracks}")
+        chunk_id = data[pos:pos + 4]
+        length = struct.unpack(">I", data[pos + 4:pos + 8])[0]
+        if pos + 8 + length > len(data):
+            raise MidiError("Chunk is shorter than its header says")
+        # the spec says to skip chunk types we don't know, some files carry their own
+        if chunk_id == b"MTrk":
+            try:
+                events.extend(_read_track(data[pos + 8:pos + 8 + length]))
+            except IndexError:
+                raise MidiError("Track ends in the middle of an event") from None
+            tracks += 1
+        pos += 8 + length
+
+    # tempo changes apply across all tracks, so everything gets timed off one sorted list.
+    # offs sort before ons at the same tick so a repeated note doesn't cut itself off
+    order = {"tempo": 0, "off": 1, "on": 2}
+    events.sort(key=lambda event: (event[0], order[event[1]]))
+
+    if division < 0:
+        # smpte: -frames per second in the high byte, ticks per frame in the low one
+        seconds_per_tick = 1.0 / ((-(division >> 8)) * (division & 0xFF))
+        tempo_scale = None
+    else:
+        tempo_scale = 1e-6 / division  # seconds per tick = microseconds per beat * this
+        seconds_per_tick = 500000 * tempo_scale  # 120 bpm until told otherwise
+
+    held = {}
+    starts, ends, notes, velocities, channels = [], [], [], [], []
+    last_tick, seconds = 0, 0.0
+    for tick, kind, a, b, channel in events:
+        seconds += (tick - last_tick) * seconds_per_tick
+        last_tick = tick
+        if kind == "tempo":
+            if tempo_scale is not None:
+                seconds_per_tick = a * tempo_scale
+        elif channel == DRUM_CHANNEL and not include_drums:
+            continue
+        elif kind == "on":
+            held.setdefault((channel, a), []).append((seconds, b))
+        elif held.get((channel, a)):
+            start, velocity = held[(channel, a)].pop(0)
+            starts.append(start)
+            ends.append(seconds)
+            notes.append(a)
+            velocities.append(velocity)
+            channels.append(channel)
+
+    # anything never released rings until the last event
+    for (channel, note), pending in held.items():
+        for start, velocity in pending:
+            starts.append(start)
+            ends.append(max(seconds, start))
+            notes.append(note)
+            velocities.append(velocity)
+            channels.append(channel)
+
+    starts = np.array(starts, dtype=np.float64)
+    order = np.argsort(starts, kind="stable")
+    return MidiNotes(
+        starts=starts[order],
+        ends=np.array(ends, dtype=np.float64)[order],
+        notes=np.array(notes, dtype=np.int64)[order],
+        velocities=np.array(velocities, dtype=np.int64)[order],
+        channels=np.array(channels, dtype=np.int64)[order],
+    )
+
+
+def allocate_voices(starts, ends, max_voices=MAX_VOICES):
+    """
+    voice slot for every note (sorted by start). a free slot if there is one, otherwise the
+    note that started first gets cut off. returns (voices, ends with the stolen notes shortened)
+    """
+    ends = ends.copy()
+    voices = np.empty(len(starts), dtype=np.int64)
+    playing = np.full(max_voices, -1)  # note index in each slot
+    for note, start in enumerate(starts):
+        busy = playing >= 0
+        busy[busy] = ends[playing[busy]] > start
+        free = np.flatnonzero(~busy)
+        if len(free):
+            slot = free[0]
+        else:
+            slot = int(np.argmin(starts[playing]))
+            ends[playing[slot]] = start
+        playing[slot] = note
+        voices[note] = slot
+    return voices, ends
+
+
+def render_midi(midi, wave_choice=None, sample_rate=PLAYBACK_RATE, max_voices=MAX_VOICES, block=MIDI_BLOCK,
+                rng=None):
+    """
+    renders MidiNotes to a mono buffer. wave_choice picks the oscillator pool like the chord
+    player does (a random one per note), None gives every channel its own oscillator.
+    rng is a numpy Generator for those picks and the noise, a fresh unseeded one if not given
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    starts = np.round(midi.starts * sample_rate).astype(np.int64)
+    ends = np.round(midi.ends * sample_rate).astype(np.int64)
+    voices, ends = allocate_voices(starts, np.maximum(ends, starts + 1), max_voices)
+    length = int(ends.max()) if len(ends) else 0
+    output = np.zeros(length, dtype=SAMPLE_DTYPE)
+    if length == 0:
+        return output
+
+    if wave_choice is None:
+        shapes = np.array(CHANNEL_SHAPES)[midi.channels % len(CHANNEL_SHAPES)]
+    else:
+        pool = [TONE_SHAPES.get(tone, "noise") for tone in get_tone(wave_choice)]
+        shapes = np.array(pool)[rng.integers(len(pool), size=len(midi))]
+    shape_names, shape_codes = np.unique(shapes, return_inverse=True)
+    table_size = _table_size(sample_rate)
+    # every table in one array so a whole block reads out of it in one go, noise gets a silent row
+    tables = np.concatenate([np.zeros(table_size + 1, dtype=SAMPLE_DTYPE) if shape == "noise"
+                             else _wavetable(shape, sample_rate) for shape in shape_names])
+    table_starts = np.arange(len(shape_names)) * (table_size + 1)
+    noise_code = int(np.searchsorted(shape_names, "noise")) if "noise" in shape_names else None
+
+    increments = midi_to_frequency(midi.notes) * table_size / sample_rate
+    # the fade gets done in whole samples, so the 1 / FADE_SAMPLES goes in with the gain
+    fade_gains = (VOICE_AMPLITUDE * midi.velocities / 127.0 / FADE_SAMPLES).astype(SAMPLE_DTYPE)
+    lengths = ends - starts
+    steps = np.arange(block)
+
+    # a slot plays its notes one after another (a stolen note ends where the next one starts)
+    # and notes are sorted by start, so the note a slot is playing at any sample is the
+    # highest numbered one in it that has started by then
+    slots = int(voices.max()) + 1
+    by_slot = np.lexsort((starts, voices))
+    span = length + 1  # keeps one slot's keys clear of the next one's
+    slot_keys = voices[by_slot] * span + starts[by_slot]
+    slot_first = np.searchsorted(voices[by_slot], np.arange(slots))
+    slot_base = np.arange(slots) * span
+    playing = np.empty((slots, block), dtype=np.int64)
+    row_of_slot = np.empty(slots, dtype=np.int64)
+
+    for block_start in range(0, length, block):
+        n = min(block, length - block_start)
+        positions = block_start + steps[:n]
+
+        # what each slot holds as the block starts, -1 for a slot nothing has played in yet
+        found = np.searchsorted(slot_keys, slot_base + block_start, side="right") - 1
+        held = np.where(found >= slot_first, by_slot[np.maximum(found, 0)], -1)
+        first = int(np.searchsorted(starts, block_start, side="right"))
+        last = int(np.searchsorted(starts, block_start + n))
+        starting = np.arange(first, last)
+
+        # only slots still sounding or getting a new note need rendering
+        busy = (held >= 0) & (ends[held] > block_start)
+        busy[voices[starting]] = True
+        rows = np.flatnonzero(busy)
+        if len(rows) == 0:
+            continue
+        row_of_slot[rows] = np.arange(len(rows))
+
+        # (rows x samples) note in each slot: the held one until a note starts in it
+        note = playing[:len(rows), :n]
+        note.fill(-1)
+        note[:, 0] = held[rows]
+        np.maximum.at(note, (row_of_slot[voices[starting]], starts[starting] - block_start), starting)
+        np.maximum.accumulate(note, axis=1, out=note)
+
+        idle = note < 0
+        np.maximum(note, 0, out=note)
+        note_lengths = lengths[note]
+        local = positions - starts[note]
+        # past the end or before anything played the fade is zero
+        np.minimum(local, note_lengths, out=local)
+        local[idle] = 0
+
+        fade = np.minimum(local, note_lengths - local)
+        np.clip(fade, 0, FADE_SAMPLES, out=fade)
+        envelope = fade_gains[note] * fade.astype(SAMPLE_DTYPE)
+
+        phase = _table_phase(local, increments[note], table_size)
+        # idle samples read some other note's table too, the envelope zeroes them
+        codes = shape_codes[note]
+        slot_audio = _table_lookup(tables, phase, table_starts[codes])
+        if noise_code is not None:
+            noisy = (codes == noise_code) & (envelope > 0)
+            slot_audio[noisy] = rng.uniform(-1, 1, int(noisy.sum()))
+
+        slot_audio *= envelope
+        slot_audio.sum(axis=0, out=output[block_start:block_start + n])
+
+    # lots of voices at once can go past full scale, just turn the whole thing down then
+    peak = float(np.abs(output).max())
+    if peak > 0.99:
+        output *= SAMPLE_DTYPE(0.99 / peak)
+    return output
+
+
+def midi_timeline(midi, sample_rate=PLAYBACK_RATE):
+    """one timeline event per onset, labelled with the chord the lowest sounding notes make"""
+    if len(midi) == 0:
+        return ChordTimeline(end=0)
+
+    starts = midi.starts
+    # a new event whenever a note starts more than ONSET_WINDOW after the last event
+    onset_starts = [starts[0]]
+    for start in starts[1:]:
+        if start - onset_starts[-1] > ONSET_WINDOW:
+            onset_starts.append(start)
+    onset_starts = np.array(onset_starts)
+
+    longest = float((midi.ends - starts).max())
+    frequencies = np.zeros((len(onset_starts), 3))
+    qualities, labels = [], []
+    for k, onset in enumerate(onset_starts):
+        # only notes that started recently enough can still be sounding
+        lo = int(np.searchsorted(starts, onset - longest, side="left"))
+        hi = int(np.searchsorted(starts, onset + ONSET_WINDOW, side="right"))
+        sounding = midi.ends[lo:hi] > onset
+        notes = np.unique(midi.notes[lo:hi][sounding])[:3]
+        if len(notes) == 0:
+            qualities.append("Note")
+            labels.append("rest")
+            continue
+        frequencies[k, :len(notes)] = midi_to_frequency(notes)
+        if len(notes) == 3:
+            quality = chord_qualities(notes[1:2] - notes[0], notes[2:3] - notes[0])[0]
+            qualities.append(quality)
+            labels.append(chord_label(quality, *frequencies[k]))
+        else:
+            qualities.append("Note")
+            labels.append(" ".join(find_note(f) for f in frequencies[k, :len(notes)]))
+
+    return ChordTimeline.from_arrays(
+        np.round(onset_starts * sample_rate).astype(np.int64),
+        frequencies, qualities, labels,
+        end=int(np.round(midi.ends.max() * sample_rate)),
+    )
+
+
+def load_midi_file(path, wave_choice=None, sample_rate=PLAYBACK_RATE, rng=None):
+    """(audio, timeline) for a .mid file, same shape of result as load_wav_file"""
+    midi = read_midi(path)
+    audio = render_midi(midi, wave_choice, sample_rate, rng=rng)
+    timeline = midi_timeline(midi, sample_rate)
+    timeline.end = len(audio)
+    return audio, timeline
@@ -0,0 +1,121 @@
+import numpy as np
+
+from audio_loader import DECODED_CACHE_DIR, cached_file_hash, load_cached_array, load_waveform, save_cached_array
+
+"""
+min/max peak pyramid of a waveform, a mipmap for drawing it. level 1 is the min and max of
+every PEAK_BUCKET samples, each level after that covers PEAK_FACTOR times more. all levels
+live in one (buckets, 2) array which gets cached next to the decoded audio, so a file only
+gets scanned once
+"""
+
+PEAK_BUCKET = 64
+PEAK_FACTOR = 4
+BUILD_CHUNK = PEAK_BUCKET * (1 << 16)  # samples per pass when building, keeps memory flat for mmapped input
+
+
+def level_sizes(length):
+    """(bucket size in samples, bucket count) for every level, finest first"""
+    sizes = []
+    bucket = PEAK_BUCKET
+    while True:
+        count = -(-length // bucket)
+        sizes.append((bucket, count))
+        if count <= 1:
+            return sizes
+        bucket *= PEAK_FACTOR
+
+
+def _reduce(minimums, maximums, factor, out):
+    """min/max of every factor rows, the last group can be short"""
+    full = len(minimums) // factor * factor
+    np.min(minimums[:full].reshape(-1, factor), axis=1, out=out[:full // factor, 0])
+    np.max(maximums[:full].reshape(-1, factor), axis=1, out=out[:full // factor, 1])
+    if full < len(minimums):
+        out[-1, 0] = minimums[full:].min()
+        out[-1, 1] = maximums[full:].max()
+
+
+def build_peaks(waveform):
+    sizes = level_sizes(len(waveform))
+    table = np.empty((sum(count for _, count in sizes), 2), dtype=np.float32)
+    if len(waveform) == 0:
+        return table
+
+    # level 1 straight from the samples, a chunk at a time
+    first = table[:sizes[0][1]]
+    for start in range(0, len(waveform), BUILD_CHUNK):
+        chunk = np.asarray(waveform[start:start + BUILD_CHUNK])
+        rows = first[start // PEAK_BUCKET:-(-(start + len(chunk)) // PEAK_BUCKET)]
+        _reduce(chunk, chunk, PEAK_BUCKET, rows)
+
+    # everything after that from the level below it
+    offset = 0
+    for (_, finer), (_, coarser) in zip(sizes, sizes[1:]):
+        below = table[offset:offset + finer]
+        offset += finer
+        _reduce(below[:, 0], below[:, 1], PEAK_FACTOR, table[offset:offset + coarser])
+    return table
+
+
+def bucket_peaks(samples):
+    """level 1 rows for a run of samples, for callers that read a file in pieces themselves"""
+    rows = np.empty((-(-len(samples) // PEAK_BUCKET), 2), dtype=np.float32)
+    if len(samples):
+        _reduce(samples, samples, PEAK_BUCKET, rows)
+    return rows
+
+
+def thumbnail(peaks, points):
+    """squashes (min, max) rows down to at most points rows, for a small overview picture"""
+    if len(peaks) <= points:
+        return np.asarray(peaks, dtype=np.float32)
+    factor = -(-len(peaks) // points)
+    out = np.empty((-(-len(peaks) // factor), 2), dtype=np.float32)
+    _reduce(peaks[:, 0], peaks[:, 1], factor, out)
+    return out
+
+
+class PeakPyramid:
+    def __init__(self, waveform, table):
+        self.waveform = waveform
+        self.levels = []
+        offset = 0
+        for bucket, count in level_sizes(len(waveform)):
+            self.levels.append((bucket, table[offset:offset + count]))
+            offset += count
+
+    def __len__(self):
+        return len(self.waveform)
+
+    def view(self, first, last, max_points=4000):
+        """
+        (x, y) to plot for samples [first, last). raw samples when they fit in max_points,
+        otherwise min, max pairs from the coarsest level that still has enough detail
+        """
+        first = int(np.clip(first, 0, len(self.waveform)))
+        last = int(np.clip(last, first, len(self.waveform)))
+        if last - first <= max_points:
+            return np.arange(first, last), np.asarray(self.waveform[first:last])
+
+        bucket, peaks = self.levels[-1]
+        for bucket, peaks in self.levels:
+            if (last - first) / bucket * 2 <= max_points:
+                break
+        a, b = first // bucket, -(-last // bucket)
+        x = np.repeat(np.arange(a, b) * bucket + bucket // 2, 2)
+        return x, np.asarray(peaks[a:b]).reshape(-1)
+
+
+def load_peaks(path, sample_rate=44100):
+    """pyramid for a file, the decoded audio and the peaks both come from the disk cache when they can"""
+    waveform = load_waveform(path, sample_rate)
+    cache_path = DECODED_CACHE_DIR / f"{cached_file_hash(path)}_{sample_rate}_peaks.npy"
+    table = load_cached_array(cache_path)
+    if table is None:
+        table = build_peaks(waveform)
+        try:
+            table = save_cached_array(cache_path, table)
+        except OSError as e:
+            print(f"Could not cache peaks for {path}: {e}")
+    return PeakPyramid(waveform, table)
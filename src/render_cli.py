@@ -0,0 +1,217 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, asdict, fields, replace
+from pathlib import Path
+
+import soundfile as sf
+
+from audio_engine import NOTE_NAMES, WAVE_CHOICES, SCALE_INTERVALS, PLAYBACK_RATE
+from render_graph import RenderGraph, StageCache, chord_source, effect_stages
+
+"""
+renders progressions straight to wav files without the gui, same knobs the gui has
+(key, scale, wave, bpm, downsample, flanger). every option takes several values and
+the renderer goes through every combination, spread over a process pool
+
+    python src/render_cli.py --key C A --wave Sine Saw --downsample 0 8000 --takes 4 -o clips/
+    python src/render_cli.py --jobs jobs.json -o clips/
+
+a jobs file is a json list of objects with the same field names as RenderJob.
+in a sweep every effect setting gets the same progressions (same seeds), and jobs sharing
+a progression go to the same worker so it only gets rendered once (see render_graph)
+"""
+
+WORKER_CACHE_BYTES = 64 * 1024 * 1024  # per process, only has to hold one group's progression
+
+
+@dataclass(frozen=True)
+class RenderJob:
+    """one clip, everything a worker needs to render it on its own"""
+    key: str = "C"
+    scale: str = "Major"
+    wave: str = "Random (All)"
+    bpm: int = 120
+    chords: int = 32
+    downsample_rate: object = None
+    flanger: bool = False
+    flanger_rate: float = 0.5
+    flanger_depth: float = 0.004  # seconds, same as the gui slider / 1000
+    seed: int = 0
+    path: str = ""
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9#]+", "-", str(text)).strip("-")
+
+
+def job_filename(index, job):
+    quality = "clean" if job.downsample_rate is None else f"{job.downsample_rate}hz"
+    flanger = f"_flanger{job.flanger_rate:g}-{job.flanger_depth * 1000:g}ms" if job.flanger else ""
+    return f"{index:05d}_{_slug(job.key)}-{job.scale}_{_slug(job.wave)}_{job.bpm}bpm_{quality}{flanger}.wav"
+
+
+_graph = RenderGraph(StageCache(WORKER_CACHE_BYTES))  # one per worker process
+
+
+def source_key(job):
+    return job.chords, job.bpm, job.key, job.scale, job.wave, job.seed
+
+
+def render_job(job, subtype="PCM_16"):
+    """renders a single job to job.path, runs inside the worker processes"""
+    stages = [("chords", chord_source, source_key(job))]
+    stages += effect_stages(job.downsample_rate, job.flanger, job.flanger_rate, job.flanger_depth)
+
+    audio, _ = _graph.render(stages)
+
+    sf.write(job.path, audio, PLAYBACK_RATE, subtype=subtype)
+    return job.path, len(audio) / PLAYBACK_RATE
+
+
+def render_group(jobs, subtype="PCM_16"):
+    """jobs that share a source, the first one renders it and the rest reuse it"""
+    return [render_job(job, subtype) for job in jobs]
+
+
+def sweep_jobs(args, seeds):
+    """every combination of the given values, --takes progressions each with every effect setting"""
+    sources = itertools.product(args.key, args.scale, args.wave, args.bpm, args.chords, range(args.takes))
+    for key, scale, wave, bpm, chords, _ in sources:
+        seed = next(seeds)
+        effects = itertools.product(
+            args.downsample,
+            # flanger settings only multiply the sweep when the flanger is on
+            args.flanger_rate if args.flanger else args.flanger_rate[:1],
+            args.flanger_depth if args.flanger else args.flanger_depth[:1],
+        )
+        for downsample, rate, depth in effects:
+            yield RenderJob(key=key, scale=scale, wave=wave, bpm=bpm, chords=chords,
+                            downsample_rate=downsample or None, flanger=args.flanger,
+                            flanger_rate=rate, flanger_depth=depth / 1000.0, seed=seed)
+
+
+def file_jobs(path, seeds):
+    known = {field.name for field in fields(RenderJob)}
+    try:
+        entries = json.loads(Path(path).read_text())
+    except OSError as e:
+        raise ValueError(f"Can't read {path}: {e}") from None
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path} is not valid json: {e}") from None
+    if not isinstance(entries, list) or not all(isinstance(entry, dict) for entry in entries):
+        raise ValueError(f"{path} has to hold a json list of job objects")
+    for entry in entries:
+        unknown = set(entry) - known
+        if unknown:
+            raise ValueError(f"Unknown job fields {sorted(unknown)} in {path}")
+        entry.setdefault("seed", next(seeds))
+        yield RenderJob(**entry)
+
+
+def _positive(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
+def validate(job):
+    """raises ValueError saying what's wrong with job, the parent calls this before any worker sees it"""
+    if not isinstance(job.key, str) or job.key not in NOTE_NAMES:
+        raise ValueError(f"Unknown key {job.key!r}; expected one of {NOTE_NAMES}")
+    if not isinstance(job.scale, str) or job.scale not in SCALE_INTERVALS:
+        raise ValueError(f"Unknown scale {job.scale!r}; expected one of {list(SCALE_INTERVALS)}")
+    if not isinstance(job.wave, str) or job.wave not in WAVE_CHOICES:
+        raise ValueError(f"Unknown wave {job.wave!r}; expected one of {WAVE_CHOICES}")
+    if not _positive(job.bpm) or not isinstance(job.chords, int) or not _positive(job.chords):
+        raise ValueError(f"bpm and chords have to be positive, got bpm {job.bpm!r} and chords {job.chords!r}")
+    if job.downsample_rate is not None and not _positive(job.downsample_rate):
+        raise ValueError(f"downsample_rate has to be a positive rate in Hz or null, got {job.downsample_rate!r}")
+    if job.flanger and not (_positive(job.flanger_rate) and _positive(job.flanger_depth)):
+        raise ValueError("flanger_rate and flanger_depth have to be positive")
+    if not isinstance(job.seed, int) or isinstance(job.seed, bool) or not 0 <= job.seed < 2 ** 32:
+        raise ValueError(f"seed has to be a whole number from 0 to 2**32 - 1, got {job.seed!r}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="render chord progressions to wav files, no gui needed")
+    parser.add_argument("-o", "--output", type=Path, default=Path("renders"), help="folder for the wav files")
+    parser.add_argument("--jobs", type=Path, help="json list of jobs, replaces the sweep options below")
+    parser.add_argument("--key", nargs="+", default=["C"], choices=NOTE_NAMES)
+    parser.add_argument("--scale", nargs="+", default=["Major"], choices=list(SCALE_INTERVALS))
+    parser.add_argument("--wave", nargs="+", default=["Random (All)"], choices=WAVE_CHOICES)
+    parser.add_argument("--bpm", nargs="+", type=int, default=[120])
+    parser.add_argument("--chords", nargs="+", type=int, default=[32], help="chords per clip")
+    parser.add_argument("--downsample", nargs="+", type=int, default=[0], help="target rates in Hz, 0 = clean")
+    parser.add_argument("--flanger", action="store_true")
+    parser.add_argument("--flanger-rate", nargs="+", type=float, default=[0.5], help="lfo rate in Hz")
+    parser.add_argument("--flanger-depth", nargs="+", type=float, default=[4.0], help="max delay in ms")
+    parser.add_argument("--takes", type=int, default=1, help="progressions per combination, each with its own seed")
+    parser.add_argument("--seed", type=int, help="first seed, each new progression gets the next one (random if not given)")
+    parser.add_argument("--subtype", default="PCM_16", help="soundfile subtype, e.g. PCM_16, PCM_24, FLOAT")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="render processes")
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    first_seed = args.seed if args.seed is not None else random.SystemRandom().randrange(2 ** 31)
+    seeds = itertools.count(first_seed)
+    # every job gets checked up front, a bad one ends the run like any other bad argument
+    # instead of as a traceback out of a worker halfway through
+    try:
+        jobs = list(file_jobs(args.jobs, seeds) if args.jobs else sweep_jobs(args, seeds))
+    except ValueError as e:
+        parser.error(str(e))
+    for index, job in enumerate(jobs):
+        try:
+            validate(job)
+        except ValueError as e:
+            parser.error(f"job {index}: {e}")
+    if not jobs:
+        print("Nothing to render")
+        return 1
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    jobs = [replace(job, path=job.path or str(args.output / job_filename(index, job)))
+            for index, job in enumerate(jobs)]
+
+    # written first so the exact settings (and seeds) survive even if the run gets killed
+    manifest = args.output / "manifest.json"
+    manifest.write_text(json.dumps([asdict(job) for job in jobs], indent=2))
+
+    workers = max(1, min(args.workers or 1, len(jobs)))
+    print(f"Rendering {len(jobs)} clips on {workers} processes into {args.output}")
+    started = time.perf_counter()
+    audio_seconds = 0.0
+
+    groups = {}
+    for job in jobs:
+        groups.setdefault(source_key(job), []).append(job)
+    groups = list(groups.values())
+
+    # bigger chunks keep the pool busy when there are thousands of short clips
+    chunksize = max(1, len(groups) // (workers * 8))
+    subtypes = itertools.repeat(args.subtype)
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rendered in executor.map(render_group, groups, subtypes, chunksize=chunksize):
+            for path, seconds in rendered:
+                done += 1
+                audio_seconds += seconds
+                if done == len(jobs) or done % max(1, len(jobs) // 20) == 0:
+                    print(f"  {done}/{len(jobs)}  {Path(path).name}", flush=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"Rendered {audio_seconds:.1f}s of audio in {elapsed:.1f}s ({audio_seconds / elapsed:.1f}x real time)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from audio_engine import NOTE_NAMES, PLAYBACK_RATE, apply_downsample, apply_flanger, chord_player
+from midi import load_midi_file
+
+"""
+offline rendering as a chain of stages, source -> downsample -> flanger. every stage's output
+gets cached under the parameters of that stage and everything before it, so changing the
+flanger depth only reruns the flanger, and a sweep over effect settings renders each
+progression once. the cache is bounded by bytes and throws out the least recently used
+outputs first
+"""
+
+STAGE_CACHE_BYTES = 256 * 1024 * 1024
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, tuple):
+        return sum(_nbytes(item) for item in value)
+    return 0
+
+
+class StageCache:
+    def __init__(self, max_bytes=STAGE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = _nbytes(value)
+        if size > self.max_bytes:
+            return  # would push everything else out and still not fit
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+
+class RenderGraph:
+    """
+    runs a chain of (name, function, params) stages. the first function makes the source,
+    the rest take the previous stage's audio. params have to be hashable
+    """
+
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else StageCache()
+
+    def render(self, stages):
+        keys = []
+        for name, _, params in stages:
+            keys.append((keys[-1] if keys else None, name, params))
+
+        # start from the furthest stage that's already cached
+        result, first = None, 0
+        for index in range(len(stages) - 1, -1, -1):
+            result = self.cache.get(keys[index])
+            if result is not None:
+                first = index + 1
+                break
+
+        for index in range(first, len(stages)):
+            _, function, params = stages[index]
+            result = function(*params) if index == 0 else function(result, *params)
+            self.cache.put(keys[index], result)
+        return result
+
+
+def chord_source(chords, bpm, key, scale, wave, seed):
+    """seeded chord_player, the same seed always gives the same progression"""
+    return chord_player(chords, bpm, NOTE_NAMES.index(key), scale, wave, None, np.random.default_rng(seed))
+
+
+def midi_source(path, content_hash, wave_choice=None, seed=0):
+    """
+    rendered midi file, content_hash is only there so an edited file misses the cache.
+    seeded like chord_source, so a wave_choice render comes out the same every time
+    """
+    return load_midi_file(path, wave_choice, rng=np.random.default_rng(seed))
+
+
+def downsample_stage(source, rate):
+    audio, timeline = source
+    return apply_downsample(audio, rate, PLAYBACK_RATE), timeline
+
+
+def flanger_stage(source, lfo_rate, depth):
+    audio, timeline = source
+    return apply_flanger(audio, PLAYBACK_RATE, lfo_rate, depth), timeline
+
+
+def effect_stages(downsample_rate=None, flanger=False, flanger_rate=0.5, flanger_depth=0.004):
+    """the stages after the source, in the same order the live effect chain uses"""
+    stages = []
+    if downsample_rate:
+        stages.append(("downsample", downsample_stage, (downsample_rate,)))
+    if flanger:
+        stages.append(("flanger", flanger_stage, (flanger_rate, flanger_depth)))
+    return stages
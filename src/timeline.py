@@ -0,0 +1,119 @@
+import threading
+
+import numpy as np
+
+"""
+what's playing when. one row per event (a chord, a note, a whole file) stored as plain
+arrays: start sample, root/third/fifth frequency, quality code and a label string made
+once up front, so the gui can look up the event under the cursor with a binary search
+and never builds strings per frame. events can be any length
+"""
+
+QUALITY_NAMES = ["???", "Maj", "Min", "Dim", "Aug", "File", "Note"]
+QUALITY_CODES = {name: code for code, name in enumerate(QUALITY_NAMES)}
+
+
+class ChordTimeline:
+    def __init__(self, end=None, capacity=64):
+        self.end = end  # sample where the last event stops, None while it keeps growing
+        self.first_number = 0  # how many events got dropped off the front (see drop_before)
+        self._count = 0
+        self._starts = np.empty(capacity, dtype=np.int64)
+        self._frequencies = np.empty((capacity, 3))
+        self._codes = np.empty(capacity, dtype=np.int8)
+        self._labels = np.empty(capacity, dtype=object)
+        # streams append from their producer thread while the gui reads
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_arrays(cls, starts, frequencies, qualities, labels, end=None):
+        timeline = cls(end, capacity=max(1, len(starts)))
+        timeline.extend(starts, frequencies, qualities, labels)
+        return timeline
+
+    @classmethod
+    def single(cls, label, length, quality="File"):
+        """one event covering everything, for plain files"""
+        return cls.from_arrays([0], [[0.0, 0.0, 0.0]], [quality], [label], end=length)
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def starts(self):
+        return self._starts[:self._count]
+
+    @property
+    def frequencies(self):
+        return self._frequencies[:self._count]
+
+    @property
+    def quality_codes(self):
+        return self._codes[:self._count]
+
+    @property
+    def labels(self):
+        return self._labels[:self._count]
+
+    def quality(self, index):
+        return QUALITY_NAMES[self._codes[index]]
+
+    def _grow(self, needed):
+        capacity = max(needed, 2 * len(self._starts))
+        for name in ("_starts", "_frequencies", "_codes", "_labels"):
+            old = getattr(self, name)
+            new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._count] = old[:self._count]
+            setattr(self, name, new)
+
+    def extend(self, starts, frequencies, qualities, labels):
+        """adds events in start order, qualities can be names or codes"""
+        n = len(starts)
+        qualities = [QUALITY_CODES[q] if isinstance(q, str) else q for q in qualities]
+        with self._lock:
+            if self._count + n > len(self._starts):
+                self._grow(self._count + n)
+            rows = slice(self._count, self._count + n)
+            self._starts[rows] = starts
+            self._frequencies[rows] = frequencies
+            self._codes[rows] = qualities
+            self._labels[rows] = labels
+            self._count += n
+
+    def append(self, start, frequencies, quality, label):
+        self.extend([start], [frequencies], [quality], [label])
+
+    def drop_before(self, cursor):
+        """forgets events that finished before cursor, the one under it stays"""
+        with self._lock:
+            keep = int(np.searchsorted(self.starts, cursor, side="right")) - 1
+            if keep <= 0:
+                return
+            for array in (self._starts, self._frequencies, self._codes, self._labels):
+                array[:self._count - keep] = array[keep:self._count]
+            self._count -= keep
+            self.first_number += keep
+
+    def events_since(self, number):
+        """copies of the rows from event number onwards (counting dropped ones), for sending elsewhere"""
+        with self._lock:
+            rows = slice(max(number - self.first_number, 0), self._count)
+            return (self._starts[rows].copy(), self._frequencies[rows].copy(),
+                    self._codes[rows].copy(), self._labels[rows].tolist())
+
+    def index_at(self, cursor):
+        """row of the event under cursor, -1 before the first one or past the end"""
+        with self._lock:
+            if self.end is not None and cursor >= self.end:
+                return -1
+            return int(np.searchsorted(self._starts[:self._count], cursor, side="right")) - 1
+
+    def label_at(self, cursor):
+        """(event number counting dropped ones, label) for the event under cursor, or None"""
+        with self._lock:
+            if self.end is not None and cursor >= self.end:
+                return None
+            index = int(np.searchsorted(self._starts[:self._count], cursor, side="right")) - 1
+            if index < 0:
+                return None
+            return self.first_number + index, self._labels[index]
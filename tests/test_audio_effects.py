@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from audio_effects import Downsampler, Flanger, PitchShifter
+from audio_engine import apply_downsample, apply_flanger
+
+RATE = 44100
+BLOCK = 1024
+
+
+def shifted(frequency, ratio, seconds=3.0):
+    """a sine through the pitch shifter a block at a time like the callback does, minus the first half second"""
+    tone = (0.5 * np.sin(2 * np.pi * frequency * np.arange(int(RATE * seconds)) / RATE)).astype(np.float32)
+    shifter = PitchShifter(RATE, BLOCK)
+    shifter.set_ratio(ratio)
+    for start in range(0, len(tone), BLOCK):
+        shifter.process(tone[start:start + BLOCK])
+    return tone[RATE // 2:]
+
+
+def spectrum(audio):
+    padded = 8 * len(audio)
+    return np.fft.rfftfreq(padded, 1 / RATE), np.abs(np.fft.rfft(audio * np.hanning(len(audio)), padded))
+
+
+def fundamental(frequencies, magnitudes):
+    """strongest bin, refined with a parabola through the log magnitudes around it"""
+    k = int(np.argmax(magnitudes))
+    left, middle, right = np.log(magnitudes[k - 1:k + 2])
+    return frequencies[k] + 0.5 * (left - right) / (left - 2 * middle + right) * (frequencies[1] - frequencies[0])
+
+
+@pytest.mark.parametrize("frequency", [110.0, 220.0, 440.0])
+@pytest.mark.parametrize("ratio", [0.5, 0.7, 1.06, 1.5, 2.0])
+def test_pitch_shifter_lands_on_the_shifted_fundamental(frequency, ratio):
+    frequencies, magnitudes = spectrum(shifted(frequency, ratio))
+    target = frequency * ratio
+
+    cents = 1200 * np.log2(fundamental(frequencies, magnitudes) / target)
+    assert abs(cents) < 3
+
+    # and the energy is actually there, not spread over sidebands around it
+    near = np.abs(frequencies - target) < 3
+    assert np.sum(magnitudes[near] ** 2) / np.sum(magnitudes ** 2) > 0.95
+
+
+def test_pitch_shifter_passes_audio_through_at_ratio_one():
+    shifter = PitchShifter(RATE, BLOCK)
+    shifter.set_ratio(1.0)
+    block = np.random.default_rng(0).uniform(-1, 1, BLOCK).astype(np.float32)
+    expected = block.copy()
+    shifter.process(block)
+    assert np.array_equal(block, expected)
+
+
+def noise(seconds=3.0):
+    return np.random.default_rng(0).uniform(-1, 1, int(RATE * seconds)).astype(np.float32)
+
+
+def in_blocks(effect, audio, block):
+    """audio through effect a block at a time, odd block sizes so they never line up with the chunks"""
+    audio = audio.copy()
+    for start in range(0, len(audio), block):
+        effect.process(audio[start:start + block])
+    return audio
+
+
+@pytest.mark.parametrize("rate", [3000, 8000, 11025])
+def test_downsampler_blocks_match_the_chunked_offline_pass(rate):
+    audio = noise()
+    downsampler = Downsampler(RATE, BLOCK)
+    downsampler.set_rate(rate)
+    expected = apply_downsample(audio, rate, RATE, chunk_size=5000)
+    assert np.array_equal(in_blocks(downsampler, audio, 700), expected)
+
+
+@pytest.mark.parametrize("lfo_rate, depth", [(0.5, 0.004), (3.0, 0.015)])
+def test_flanger_blocks_match_the_chunked_offline_pass(lfo_rate, depth):
+    audio = noise()
+    flanger = Flanger(RATE, lfo_rate, depth, BLOCK)
+    flanger.enabled = True
+    expected = apply_flanger(audio, RATE, lfo_rate, depth, chunk_size=7000)
+    # the block version interpolates in float32 and carries its lfo phase, so a few ulps apart
+    np.testing.assert_allclose(in_blocks(flanger, audio, 1000), expected, rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 4097, 1 << 16])
+def test_offline_effects_do_not_depend_on_the_chunk_size(chunk_size):
+    audio = noise(1.0)
+    assert np.array_equal(apply_downsample(audio, 8000, RATE, chunk_size=chunk_size),
+                          apply_downsample(audio, 8000, RATE, chunk_size=len(audio)))
+    assert np.array_equal(apply_flanger(audio, RATE, chunk_size=chunk_size),
+                          apply_flanger(audio, RATE, chunk_size=len(audio)))
@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+
+import audio_loader
+
+
+def cache_file(folder, name, size, age):
+    path = folder / name
+    path.write_bytes(b"\0" * size)
+    os.utime(path, ns=(age, age))
+    return path
+
+
+def test_trim_drops_the_least_recently_used_files_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_loader, "DECODED_CACHE_DIR", tmp_path)
+    oldest = cache_file(tmp_path, "a.npy", 400, 1_000_000_000)
+    middle = cache_file(tmp_path, "b.npy", 400, 2_000_000_000)
+    newest = cache_file(tmp_path, "c.npy", 400, 3_000_000_000)
+    writing = cache_file(tmp_path, "d.npy.123.tmp", 400, 0)
+
+    audio_loader.trim_decoded_cache(max_bytes=900)
+    assert not oldest.exists()
+    assert middle.exists() and newest.exists()
+    assert writing.exists()  # half written files belong to someone else
+
+
+def test_trim_never_drops_the_file_it_was_told_to_keep(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_loader, "DECODED_CACHE_DIR", tmp_path)
+    kept = cache_file(tmp_path, "a.npy", 400, 1_000_000_000)
+    other = cache_file(tmp_path, "b.npy", 400, 2_000_000_000)
+
+    audio_loader.trim_decoded_cache(max_bytes=500, keep=kept)
+    assert kept.exists() and not other.exists()
+
+
+def test_loading_a_cached_array_marks_it_recently_used(tmp_path, monkeypatch):
+    monkeypatch.setattr(audio_loader, "DECODED_CACHE_DIR", tmp_path)
+    monkeypatch.setattr(audio_loader, "DECODED_CACHE_BYTES", 10 ** 9)
+    first = audio_loader.save_cached_array(tmp_path / "first.npy", np.zeros(100, dtype=np.float32))
+    second = tmp_path / "second.npy"
+    audio_loader.save_cached_array(second, np.ones(100, dtype=np.float32))
+    os.utime(tmp_path / "first.npy", ns=(1, 1))
+    os.utime(second, ns=(2, 2))
+
+    assert np.array_equal(audio_loader.load_cached_array(tmp_path / "first.npy"), first)
+    audio_loader.trim_decoded_cache(max_bytes=os.path.getsize(second))
+    assert (tmp_path / "first.npy").exists() and not second.exists()
+    assert audio_loader.load_cached_array(second) is None
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+import soundfile as sf
+
+from audio_backends import WavFileBackend
+from audio_player import AudioPlayer
+
+RATE = 44100
+
+
+@pytest.mark.parametrize("length", [RATE, RATE + 37, 100])
+def test_render_offline_writes_exactly_the_source(tmp_path, length):
+    source = np.random.default_rng(0).uniform(-1, 1, length).astype(np.float32)
+    path = tmp_path / "out.wav"
+    player = AudioPlayer(RATE, backend=WavFileBackend(path))
+    player.set_volume(1.0)
+    player.play(source)
+    frames = player.render_offline()
+    player.close()
+
+    written, _ = sf.read(str(path), dtype="float32")
+    assert frames == length
+    assert np.array_equal(written, source)
+
+
+def test_render_offline_at_half_speed_is_twice_as_long(tmp_path):
+    path = tmp_path / "out.wav"
+    player = AudioPlayer(RATE, backend=WavFileBackend(path))
+    player.update_rate(0.5)
+    player.play(np.ones(1000, dtype=np.float32))
+    assert player.render_offline() == 2000
+    player.close()
+    assert sf.info(str(path)).frames == 2000
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from midi import MidiError, read_midi
+
+DIVISION = 96  # ticks per beat, 120 bpm until a tempo event says otherwise
+
+
+def chunk(kind, body):
+    return kind + len(body).to_bytes(4, "big") + body
+
+
+def header(tracks, division=DIVISION):
+    return chunk(b"MThd", (1).to_bytes(2, "big") + tracks.to_bytes(2, "big") + division.to_bytes(2, "big", signed=True))
+
+
+# middle C for one beat then E for half a beat (running status, note on at velocity 0 as the off)
+MELODY = bytes([
+    0x00, 0x90, 60, 100,
+    0x60, 0x80, 60, 0,
+    0x00, 0x90, 64, 80,
+    0x30, 64, 0,
+    0x00, 0xFF, 0x2F, 0x00,
+])
+# tempo to 60 bpm at the start, applies to every track
+TEMPO = bytes([0x00, 0xFF, 0x51, 0x03]) + (1000000).to_bytes(3, "big") + bytes([0x00, 0xFF, 0x2F, 0x00])
+
+
+def write(tmp_path, data):
+    path = tmp_path / "song.mid"
+    path.write_bytes(data)
+    return path
+
+
+def test_read_midi_times_notes_in_seconds(tmp_path):
+    notes = read_midi(write(tmp_path, header(1) + chunk(b"MTrk", MELODY)))
+    np.testing.assert_allclose(notes.starts, [0.0, 0.5])
+    np.testing.assert_allclose(notes.ends, [0.5, 0.75])
+    assert list(notes.notes) == [60, 64]
+    assert list(notes.velocities) == [100, 80]
+
+
+def test_read_midi_applies_a_tempo_track_to_the_others(tmp_path):
+    notes = read_midi(write(tmp_path, header(2) + chunk(b"MTrk", TEMPO) + chunk(b"MTrk", MELODY)))
+    np.testing.assert_allclose(notes.starts, [0.0, 1.0])
+    np.testing.assert_allclose(notes.ends, [1.0, 1.5])
+
+
+def test_read_midi_skips_unknown_chunks(tmp_path):
+    data = header(1) + chunk(b"XFIH", b"vendor stuff") + chunk(b"MTrk", MELODY)
+    assert list(read_midi(write(tmp_path, data)).notes) == [60, 64]
+
+
+def test_read_midi_needs_every_track_chunk(tmp_path):
+    data = header(2) + chunk(b"MTrk", MELODY) + chunk(b"XFIH", b"not a track")
+    with pytest.raises(MidiError, match="found 1"):
+        read_midi(write(tmp_path, data))
+
+
+@pytest.mark.parametrize("cut", [len(MELODY) // 2, len(MELODY) - 3])
+def test_read_midi_rejects_a_truncated_file(tmp_path, cut):
+    # the chunk header still claims the full length, the file just stops
+    data = header(1) + chunk(b"MTrk", MELODY)
+    with pytest.raises(MidiError):
+        read_midi(write(tmp_path, data[:len(data) - cut]))
+
+
+def test_read_midi_rejects_a_track_cut_mid_event(tmp_path):
+    with pytest.raises(MidiError, match="middle of an event"):
+        read_midi(write(tmp_path, header(1) + chunk(b"MTrk", MELODY[:6])))
+
+
+def test_read_midi_rejects_a_zero_time_division(tmp_path):
+    with pytest.raises(MidiError):
+        read_midi(write(tmp_path, header(1, division=0) + chunk(b"MTrk", MELODY)))
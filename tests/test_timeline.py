@@ -0,0 +1,49 @@
+from timeline import ChordTimeline
+
+
+def chords(starts, end=None):
+    timeline = ChordTimeline(end=end, capacity=2)  # small so appending has to grow it
+    for number, start in enumerate(starts):
+        timeline.append(start, (261.6, 329.6, 392.0), "Maj", f"chord {number}")
+    return timeline
+
+
+def test_index_at_finds_the_event_under_the_cursor():
+    timeline = chords([0, 100, 250], end=400)
+    assert timeline.index_at(0) == 0
+    assert timeline.index_at(99) == 0
+    assert timeline.index_at(100) == 1
+    assert timeline.index_at(399) == 2
+    assert timeline.index_at(400) == -1
+
+
+def test_index_at_before_the_first_event():
+    assert chords([50, 100]).index_at(10) == -1
+    assert ChordTimeline().index_at(0) == -1
+
+
+def test_drop_before_keeps_the_event_under_the_cursor():
+    timeline = chords([0, 100, 200, 300])
+    timeline.drop_before(250)
+    assert list(timeline.starts) == [200, 300]
+    assert timeline.first_number == 2
+    assert timeline.label_at(250) == (2, "chord 2")
+    assert timeline.index_at(250) == 0
+
+
+def test_drop_before_the_first_event_keeps_everything():
+    timeline = chords([100, 200])
+    timeline.drop_before(50)
+    timeline.drop_before(150)
+    assert list(timeline.starts) == [100, 200]
+    assert timeline.first_number == 0
+
+
+def test_appending_after_a_drop_keeps_counting_events():
+    timeline = chords([0, 100, 200])
+    timeline.drop_before(150)
+    timeline.append(300, (0.0, 0.0, 0.0), "Note", "late")
+    assert timeline.label_at(350) == (3, "late")
+    starts, _, _, labels = timeline.events_since(2)
+    assert list(starts) == [200, 300]
+    assert labels == ["chord 2", "late"]